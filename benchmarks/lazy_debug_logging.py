@@ -0,0 +1,44 @@
+"""Hot path cost at INFO level with lazy debug logging versus building the log fields eagerly.
+
+Run with: uv run --extra mq python benchmarks/lazy_debug_logging.py
+"""
+
+import logging
+import sys
+import time
+from unittest import mock
+
+from tailucas_pylib import data, datetime, log
+
+CALLS = 100000
+
+
+def eager_log_debug(msg, extra=None):
+    # the fields were built on every call before, whatever the level
+    log.debug(msg, extra=extra() if extra else None)
+
+
+def call_rate(calls):
+    sample = {"device_key": "bench", "sample_value": 21.5}
+    started = time.perf_counter()
+    for _ in range(calls):
+        datetime.make_timestamp("1985-10-26 01:21:00")
+        data.make_payload(data=sample)
+    return calls / (time.perf_counter() - started)
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else CALLS
+    log.setLevel(logging.INFO)
+    with (
+        mock.patch.object(datetime, "log_debug", eager_log_debug),
+        mock.patch.object(data, "log_debug", eager_log_debug),
+    ):
+        before = call_rate(calls)
+    after = call_rate(calls)
+    print(f"eager fields: {before:>10.0f} calls/s")
+    print(f"lazy fields : {after:>10.0f} calls/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""make_payload throughput with the cached per-second timestamp versus formatting every call.
+
+Run with: uv run --extra mq python benchmarks/make_payload.py
+"""
+
+import sys
+import time
+from unittest import mock
+
+from tailucas_pylib import data
+from tailucas_pylib.datetime import make_timestamp
+
+PAYLOADS = 100000
+
+
+def formatted_every_call():
+    # the path make_payload took before the timestamp was cached
+    return make_timestamp().replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def payload_rate(payloads):
+    sample = {"device_key": "bench", "sample_value": 21.5}
+    started = time.perf_counter()
+    for _ in range(payloads):
+        data.make_payload(data=sample)
+    return payloads / (time.perf_counter() - started)
+
+
+def main():
+    payloads = int(sys.argv[1]) if len(sys.argv) > 1 else PAYLOADS
+    with mock.patch.object(data, "utc_iso_now", formatted_every_call):
+        before = payload_rate(payloads)
+    after = payload_rate(payloads)
+    print(f"formatted per call: {before:>10.0f} payloads/s")
+    print(f"cached per second : {after:>10.0f} payloads/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""ZMQListener forwarding cost per message, decoding and re-pickling versus raw frames.
+
+CPU time is measured on the forwarding thread only, leaving out the drainer thread.
+
+Run with: uv run --extra mq --extra monitoring python benchmarks/rabbit_listener_raw.py
+"""
+
+import sys
+import threading
+import time
+from unittest import mock
+
+import zmq
+
+from tailucas_pylib.data import make_payload
+from tailucas_pylib.rabbit import ZMQListener
+from tailucas_pylib.zmq import try_close, zmq_socket
+
+MESSAGES = 50000
+
+
+def forward_cost(messages, forward_raw):
+    url = f"inproc://bench-listener-{forward_raw}"
+    with mock.patch("pika.BlockingConnection"):
+        listener = ZMQListener(
+            zmq_url=url,
+            mq_server_address="localhost",
+            mq_exchange_name="bench",
+            mq_topic_filter="event.#",
+            mq_exchange_type="topic",
+            forward_raw=forward_raw,
+        )
+    listener.untrack()
+    sink = zmq_socket(zmq.PULL)
+    sink.bind(url)
+    listener.processor = zmq_socket(zmq.PUSH)
+    listener.processor.connect(url)
+    body = make_payload(
+        data={"device_key": "bench", "device_label": "Bench", "sample_value": 21.5, "active": True}
+    )
+
+    def drain():
+        for _ in range(messages):
+            sink.recv_multipart()
+
+    drainer = threading.Thread(target=drain)
+    drainer.start()
+    started = time.thread_time()
+    for _ in range(messages):
+        listener._forward(topic="event.device.bench", body=body)
+    elapsed = time.thread_time() - started
+    drainer.join()
+    try_close(listener.processor)
+    try_close(sink)
+    return elapsed
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else MESSAGES
+    for forward_raw in (False, True):
+        elapsed = forward_cost(messages, forward_raw)
+        print(f"forward_raw={forward_raw!s:<5}: {elapsed / messages * 1e6:>6.2f} us forwarding thread CPU/msg")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""RabbitMQRelay publish throughput by batch size against an in-process broker stand-in.
+
+The stand-in charges one socket write per connection flush, which is where a real
+broker connection spends its time on small messages.
+
+Run with: uv run --extra mq --extra monitoring python benchmarks/rabbit_relay_batch.py
+"""
+
+import socket
+import sys
+import threading
+import time
+from unittest import mock
+
+import zmq
+
+from tailucas_pylib.rabbit import RabbitMQRelay
+from tailucas_pylib.zmq import try_close, zmq_socket
+
+MESSAGES = 20000
+BATCH_SIZES = (1, 8, 32, 128)
+
+
+class LoopbackBroker:
+    """Buffers publishes and writes them to a socket pair on each flush."""
+
+    def __init__(self):
+        self._writer, self._reader = socket.socketpair()
+        self._buffer = []
+        self._impl = self
+        self._drainer = threading.Thread(target=self._drain, daemon=True)
+        self._drainer.start()
+
+    def _drain(self):
+        while self._reader.recv(65536):
+            pass
+
+    def channel(self):
+        return self
+
+    def exchange_declare(self, exchange, exchange_type):
+        pass
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        self._buffer.append(body)
+
+    def process_data_events(self, time_limit=0):
+        self._writer.sendall(b"".join(self._buffer))
+        self._buffer = []
+
+    def close(self):
+        self._writer.close()
+        self._reader.close()
+
+
+class BlockingChannel:
+    """Mimics the blocking adapter, which flushes on every publish."""
+
+    def __init__(self, broker):
+        self._broker = broker
+        self._impl = broker
+
+    def exchange_declare(self, exchange, exchange_type):
+        pass
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        self._broker.basic_publish(exchange, routing_key, body)
+        self._broker.process_data_events()
+
+
+def relay_throughput(messages, batch_size):
+    url = f"inproc://bench-rabbit-relay-{batch_size}"
+    broker = LoopbackBroker()
+    broker.channel = lambda: BlockingChannel(broker)
+    with mock.patch("pika.BlockingConnection", return_value=broker):
+        relay = RabbitMQRelay(
+            zmq_url=url,
+            mq_server_address="localhost",
+            mq_exchange_name="bench",
+            mq_topic_filter="event.#",
+            mq_exchange_type="topic",
+            mq_batch_size=batch_size,
+            mq_batch_linger_ms=1,
+        )
+    relay.untrack()
+    source = zmq_socket(zmq.PULL)
+    source.bind(url)
+    producer = zmq_socket(zmq.PUSH)
+    producer.connect(url)
+
+    def produce():
+        for i in range(messages):
+            producer.send_pyobj(("event.bench", {"device_key": "bench", "sample_value": i}))
+
+    started = time.perf_counter()
+    producer_thread = threading.Thread(target=produce)
+    producer_thread.start()
+    published = 0
+    while published < messages:
+        relay.process_message(zmq_socket=source)
+        published = relay.messages_published if batch_size > 1 else published + 1
+    elapsed = time.perf_counter() - started
+    producer_thread.join()
+    try_close(producer)
+    try_close(source)
+    broker.close()
+    return elapsed
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else MESSAGES
+    for batch_size in BATCH_SIZES:
+        elapsed = relay_throughput(messages, batch_size)
+        print(f"batch_size={batch_size:<4}: {messages / elapsed:>10.0f} msgs/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Socket churn under each ZMQ socket provenance mode.
+
+Run with: uv run --extra mq python benchmarks/zmq_provenance.py
+"""
+
+import sys
+import time
+
+import zmq
+
+from tailucas_pylib.zmq import PROVENANCE_MODES, set_socket_provenance, try_close, zmq_socket
+
+ITERATIONS = 2000
+
+
+def _nested(depth, fn):
+    # simulate the call depth of an application thread creating a socket
+    if depth == 0:
+        return fn()
+    return _nested(depth - 1, fn)
+
+
+def churn(iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        socket = _nested(10, lambda: zmq_socket(zmq.PUSH))
+        try_close(socket)
+    return time.perf_counter() - started
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else ITERATIONS
+    for mode in PROVENANCE_MODES:
+        set_socket_provenance(mode)
+        elapsed = churn(iterations)
+        print(
+            f"{mode:>8}: {iterations / elapsed:>10.0f} sockets/s "
+            f"({elapsed * 1e6 / iterations:.1f} us/socket)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""ZmqRelay throughput by batch size under a burst of small messages.
+
+Run with: uv run --extra mq --extra monitoring python benchmarks/zmq_relay_batch.py
+"""
+
+import sys
+import threading
+import time
+
+import zmq
+
+from tailucas_pylib.app import BATCH_ARRAY, BATCH_MULTIPART, ZmqRelay
+from tailucas_pylib.zmq import try_close, zmq_socket
+
+MESSAGES = 20000
+BATCH_SIZES = (1, 8, 32, 128)
+
+
+def relay_throughput(messages, batch_size, batch_format):
+    name = f"bench-relay-{batch_size}-{batch_format}"
+    source_url = f"inproc://{name}-source"
+    sink_url = f"inproc://{name}-sink"
+    relay = ZmqRelay(
+        name=name,
+        source_zmq_url=source_url,
+        sink_zmq_url=sink_url,
+        batch_size=batch_size,
+        batch_latency_ms=1,
+        batch_format=batch_format,
+    )
+    relay.untrack()
+    relay.get_socket()
+    sink = zmq_socket(zmq.PULL)
+    sink.bind(sink_url)
+    relay_sink = zmq_socket(zmq.PUSH)
+    relay_sink.connect(sink_url)
+    producer = zmq_socket(zmq.PUSH)
+    producer.connect(source_url)
+    relayed = 0
+
+    def drain():
+        while True:
+            frames = sink.recv_multipart()
+            if frames == [b"stop"]:
+                return
+
+    def produce():
+        for i in range(messages):
+            producer.send_pyobj({"device_key": "bench", "sample_value": i})
+
+    drainer = threading.Thread(target=drain)
+    drainer.start()
+    started = time.perf_counter()
+    producer_thread = threading.Thread(target=produce)
+    producer_thread.start()
+    while relayed < messages:
+        if batch_size > 1:
+            relayed += relay.process_batch(sink_socket=relay_sink)
+        else:
+            relay.process_message(sink_socket=relay_sink)
+            relayed += 1
+    elapsed = time.perf_counter() - started
+    producer_thread.join()
+    relay_sink.send(b"stop")
+    drainer.join()
+    relay.close()
+    for socket in (producer, relay_sink, sink):
+        try_close(socket)
+    return elapsed
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else MESSAGES
+    for batch_format in (BATCH_MULTIPART, BATCH_ARRAY):
+        for batch_size in BATCH_SIZES:
+            elapsed = relay_throughput(messages, batch_size, batch_format)
+            print(
+                f"{batch_format:>9} batch_size={batch_size:<4}: {messages / elapsed:>10.0f} msgs/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,13 @@ import os
 import os.path
 import socket
 import sys
+from collections.abc import Callable
 from configparser import ConfigParser
 from locale import Error as LocaleError
 from logging import Handler, Logger
 from os import getenv
 from pathlib import Path
+from typing import Any
 from urllib.parse import urlparse
 
 from pythonjsonlogger.json import JsonFormatter
@@ -26,6 +28,34 @@ try:
 except KeyError:
     pass
 
+# (log.level, log.isEnabledFor(DEBUG)) as last seen, so that setLevel on the logger invalidates it
+_debug_enabled: tuple[int, bool] | None = None
+
+
+def debug_enabled() -> bool:
+    """Whether DEBUG records are emitted, cached until the logger level changes.
+
+    Call refresh_log_level after changing the level of a parent logger or the root.
+    """
+    global _debug_enabled
+    level = log.level
+    if _debug_enabled is None or _debug_enabled[0] != level:
+        _debug_enabled = (level, log.isEnabledFor(logging.DEBUG))
+    return _debug_enabled[1]
+
+
+def refresh_log_level():
+    """Drop the cached debug_enabled result."""
+    global _debug_enabled
+    _debug_enabled = None
+
+
+def log_debug(msg: str, extra: Callable[[], dict[str, Any]] | None = None):
+    """Log at DEBUG, calling extra to build the record fields only if DEBUG is enabled."""
+    if debug_enabled():
+        log.debug(msg, extra=extra() if extra else None, stacklevel=2)
+
+
 log_handler: Handler = None  # type: ignore
 syslog_server = None
 _syslog_warning = None
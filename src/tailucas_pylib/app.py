@@ -1,12 +1,36 @@
-from threading import Thread
+import asyncio
+import multiprocessing
+import os
+import pickle
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import cache, partial
+from threading import Thread, local
 
 import zmq
 
-from . import log
+from . import APP_NAME, app_config, log, log_debug, threads
+from .codec import get_codec
 from .data import make_payload
+from .datetime import make_iso_timestamp
 from .handler import exception_handler
 from .threads import shutting_down, threads_tracked
-from .zmq import Closable
+from .zmq import (
+    Closable,
+    dump_obj,
+    load_obj,
+    recv_batch,
+    recv_obj,
+    recv_obj_async,
+    send_obj,
+    try_close,
+    zmq_socket,
+)
+
+# relay batch formats
+BATCH_MULTIPART = "multipart"
+BATCH_ARRAY = "array"
 
 
 class AppThread(Thread):
@@ -20,19 +44,88 @@ class AppThread(Thread):
 
 
 class ZmqRelay(AppThread, Closable):
-    def __init__(self, name, source_zmq_url, sink_zmq_url):
+    def __init__(
+        self,
+        name,
+        source_zmq_url,
+        sink_zmq_url,
+        batch_size: int = 1,
+        batch_latency_ms: float = 5,
+        batch_format: str = BATCH_MULTIPART,
+        passthrough: bool = False,
+        codec: str | None = None,
+    ):
+        if batch_format not in (BATCH_MULTIPART, BATCH_ARRAY):
+            raise AssertionError(f"Unsupported batch format: {batch_format}")
         AppThread.__init__(self, name=name)
-        Closable.__init__(self, connect_url=source_zmq_url)
+        Closable.__init__(self, connect_url=source_zmq_url, codec=codec)
         self._sink_zmq_url = sink_zmq_url
+        self._batch_size = batch_size
+        self._batch_latency_secs = batch_latency_ms / 1000
+        self._batch_format = batch_format
+        self._passthrough = passthrough
+
+    def _receive_batch(self, recv=None):
+        return recv_batch(
+            self.socket,
+            max_messages=self._batch_size,
+            linger_secs=self._batch_latency_secs,
+            recv=recv,
+        )
+
+    def process_batch(self, sink_socket):
+        batch = self._receive_batch()
+        if self._batch_format == BATCH_ARRAY:
+            payload = get_codec("msgpack").dumps(
+                [make_payload(data=data, pack=False) for data in batch]
+            )
+            sink_socket.send(payload)
+            payload_bytes = len(payload)
+        else:
+            payloads = [make_payload(data=data) for data in batch]
+            sink_socket.send_multipart(payloads)
+            payload_bytes = sum(len(p) for p in payloads)
+        log_debug(
+            "Relaying message batch",
+            lambda: {
+                "batch_size": len(batch),
+                "batch_format": self._batch_format,
+                "source_url": self.socket_url,
+                "sink_url": self._sink_zmq_url,
+                "payload_bytes": payload_bytes,
+            },
+        )
+        return len(batch)
+
+    def process_passthrough(self, sink_socket):
+        # producer frames are already packed; forward the buffers untouched
+        frames = self._receive_batch(recv=partial(self.socket.recv, copy=False))  # type: ignore
+        sink_socket.send_multipart([make_iso_timestamp().encode(), *frames], copy=False)
+        log_debug(
+            "Passing message frames through",
+            lambda: {
+                "frame_count": len(frames),
+                "source_url": self.socket_url,
+                "sink_url": self._sink_zmq_url,
+                "payload_bytes": sum(len(frame) for frame in frames),
+            },
+        )
+        return len(frames)
 
     def process_message(self, sink_socket):
-        data = self.socket.recv_pyobj()  # type: ignore
+        if self._passthrough:
+            self.process_passthrough(sink_socket=sink_socket)
+            return
+        if self._batch_size > 1:
+            self.process_batch(sink_socket=sink_socket)
+            return
+        data = recv_obj(self.socket)
         payload = make_payload(data=data)
         # do not info on heartbeats
         if "device_info" not in data:  # type: ignore
-            log.debug(
+            log_debug(
                 "Relaying message",
-                extra={
+                lambda: {
                     "message_bytes": len(data),  # type: ignore
                     "source_url": self.socket_url,
                     "sink_url": self._sink_zmq_url,
@@ -55,10 +148,95 @@ class ZmqRelay(AppThread, Closable):
         self.close()
 
 
+class ZmqRouter(AppThread):
+    """Serves many source to sink relay routes from one thread with a zmq.Poller.
+
+    Routes are (source_zmq_url, sink_zmq_url) or (source_zmq_url, sink_zmq_url,
+    transform) tuples. A transform takes the received object and returns the
+    bytes (or list of frames) to send; the default packs it like ZmqRelay.
+    Routes may share a sink URL.
+    """
+
+    # messages drained from one source before the others get a turn
+    DRAIN_LIMIT = 100
+
+    def __init__(self, name, routes, codec: str | None = None):
+        AppThread.__init__(self, name=name)
+        self._routes = []
+        for route in routes:
+            if len(route) == 2:
+                source_zmq_url, sink_zmq_url = route
+                transform = None
+            else:
+                source_zmq_url, sink_zmq_url, transform = route
+            self._routes.append((source_zmq_url, sink_zmq_url, transform or self.transform))
+        self._codec = codec
+
+    def transform(self, data):
+        return make_payload(data=data)
+
+    def process_message(self, source_socket, sink_socket, transform, flags=0):
+        data = recv_obj(source_socket, flags=flags)
+        payload = transform(data)
+        if isinstance(payload, list):
+            sink_socket.send_multipart(payload)
+        else:
+            sink_socket.send(payload)
+
+    def startup(self):
+        pass
+
+    def run(self):
+        self.startup()
+        with ExitStack() as stack:
+            sinks = {}
+            routing = {}
+            poller = zmq.Poller()
+            for source_zmq_url, sink_zmq_url, transform in self._routes:
+                if sink_zmq_url not in sinks:
+                    sinks[sink_zmq_url] = stack.enter_context(
+                        exception_handler(
+                            connect_url=sink_zmq_url,
+                            and_raise=False,
+                            shutdown_on_error=True,
+                        )
+                    )
+                source_socket = stack.enter_context(
+                    exception_handler(
+                        connect_url=source_zmq_url,
+                        socket_type=zmq.PULL,
+                        and_raise=False,
+                        shutdown_on_error=True,
+                        codec=self._codec,
+                    )
+                )
+                routing[source_socket] = (sinks[sink_zmq_url], transform)
+                poller.register(source_socket, zmq.POLLIN)
+            log.debug(
+                "Routing ZMQ messages",
+                extra={"route_count": len(routing), "sink_count": len(sinks)},
+            )
+            while not threads.shutting_down:
+                for source_socket, _ in poller.poll(timeout=1000):
+                    sink_socket, transform = routing[source_socket]
+                    for _ in range(self.DRAIN_LIMIT):
+                        try:
+                            self.process_message(
+                                source_socket, sink_socket, transform, flags=zmq.NOBLOCK
+                            )
+                        except zmq.Again:
+                            break
+
+
 class ZmqWorker(AppThread):
-    def __init__(self, name: str, worker_zmq_url: str):
+    def __init__(self, name: str, worker_zmq_url: str, codec: str | None = None):
         AppThread.__init__(self, name=name)
         self._worker_zmq_url = worker_zmq_url
+        self._codec = codec
+
+    @property
+    def codec(self):
+        return self._codec
 
     def process_message(self, message: dict[str, object]) -> dict[str, object]:
         raise NotImplementedError()
@@ -73,8 +251,444 @@ class ZmqWorker(AppThread):
             socket_type=zmq.REP,
             and_raise=False,
             shutdown_on_error=True,
+            codec=self._codec,
         ) as zmq_socket:
             while not shutting_down:
-                message = zmq_socket.recv_pyobj()
+                message = recv_obj(zmq_socket)
                 response = self.process_message(message=message)  # type: ignore
-                zmq_socket.send_pyobj(response)
+                send_obj(zmq_socket, response)
+
+
+class ZmqWorkerPool(ZmqWorker):
+    """ZmqWorker variant that fans requests out to a pool of worker threads.
+
+    A ROUTER socket is bound at the worker URL so that existing REQ callers are
+    unaffected, and requests are proxied over a DEALER socket to pool_size
+    threads, each of which calls process_message.
+    """
+
+    def __init__(
+        self, name: str, worker_zmq_url: str, pool_size: int = 4, codec: str | None = None
+    ):
+        if pool_size < 1:
+            raise AssertionError(f"Unsupported worker pool size: {pool_size}")
+        ZmqWorker.__init__(self, name=name, worker_zmq_url=worker_zmq_url, codec=codec)
+        self._backend_zmq_url = self._make_backend_zmq_url()
+        self._pool_workers = self._make_pool_workers(pool_size=pool_size)
+
+    def _make_backend_zmq_url(self):
+        return f"inproc://worker-pool-{id(self)}"
+
+    def _make_pool_workers(self, pool_size: int):
+        return [ZmqPoolWorker(name=f"{self.name} (pool {i})", pool=self) for i in range(pool_size)]
+
+    @property
+    def backend_zmq_url(self):
+        return self._backend_zmq_url
+
+    @property
+    def pool_size(self):
+        return len(self._pool_workers)
+
+    def untrack(self):
+        for pool_worker in self._pool_workers:
+            pool_worker.untrack()
+        AppThread.untrack(self)
+
+    def run(self):
+        self.startup()
+        with (
+            exception_handler(
+                connect_url=self._worker_zmq_url,
+                socket_type=zmq.ROUTER,
+                bind=True,
+                and_raise=False,
+                shutdown_on_error=True,
+            ) as frontend,
+            exception_handler(
+                connect_url=self._backend_zmq_url,
+                socket_type=zmq.DEALER,
+                bind=True,
+                and_raise=False,
+                shutdown_on_error=True,
+            ) as backend,
+        ):
+            log.debug(
+                "Starting ZMQ worker pool",
+                extra={
+                    "worker_url": self._worker_zmq_url,
+                    "backend_url": self._backend_zmq_url,
+                    "pool_size": len(self._pool_workers),
+                },
+            )
+            for pool_worker in self._pool_workers:
+                pool_worker.start()
+            zmq.proxy(frontend, backend)
+
+
+class ZmqPoolWorker(AppThread):
+    def __init__(self, name: str, pool: ZmqWorkerPool):
+        AppThread.__init__(self, name=name)
+        self._pool = pool
+
+    def run(self):
+        with exception_handler(
+            connect_url=self._pool.backend_zmq_url,
+            socket_type=zmq.REP,
+            bind=False,
+            and_raise=False,
+            shutdown_on_error=True,
+            codec=self._pool.codec,
+        ) as zmq_socket:
+            while not threads.shutting_down:
+                message = recv_obj(zmq_socket)
+                response = self._pool.process_message(message=message)  # type: ignore
+                send_obj(zmq_socket, response)
+
+
+class PipelinedZmqWorker(AppThread):
+    """ZmqWorker variant that accepts many outstanding requests per client.
+
+    A ROUTER socket is bound at the worker URL and requests are handed to a
+    thread pool, so replies go out in completion order. Each reply carries the
+    request envelope, including the request ID frame sent by
+    PipelinedZmqClient; plain REQ callers keep working one request at a time.
+    Requests and replies are encoded with codec, as for ZmqWorker.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        worker_zmq_url: str,
+        max_workers: int = 4,
+        max_in_flight: int = 100,
+        codec: str | None = None,
+    ):
+        AppThread.__init__(self, name=name)
+        self._worker_zmq_url = worker_zmq_url
+        self._codec = codec
+        # the request body follows the envelope as [content-type, body] with a codec
+        self._body_frames = 1 if codec is None else 2
+        self._results_zmq_url = f"inproc://pipelined-worker-{id(self)}"
+        self._max_workers = max_workers
+        self._max_in_flight = max_in_flight
+        self._local = local()
+        # closed by run once the pool threads using them have finished
+        self._handler_sockets: list[zmq.Socket[bytes]] = []
+        self._error: BaseException | None = None
+
+    def process_message(self, message: dict[str, object]) -> dict[str, object]:
+        raise NotImplementedError()
+
+    def startup(self):
+        pass
+
+    def _handle(self, envelope, body):
+        results_socket = getattr(self._local, "socket", None)
+        if results_socket is None:
+            # one results socket per pool thread; sockets are not thread-safe
+            results_socket = zmq_socket(socket_type=zmq.PUSH, codec=self._codec)
+            results_socket.connect(self._results_zmq_url)
+            self._local.socket = results_socket
+            self._handler_sockets.append(results_socket)
+        try:
+            # the results socket shares the worker's codec
+            response = self.process_message(message=load_obj(results_socket, body))
+            results_socket.send_multipart(envelope + dump_obj(results_socket, response))
+        except Exception as e:
+            if self._error is None:
+                self._error = e
+            # wake the ROUTER thread to surface the error
+            results_socket.send(b"")
+
+    def run(self):
+        self.startup()
+        executor = ThreadPoolExecutor(
+            max_workers=self._max_workers, thread_name_prefix=f"{self.name} handler"
+        )
+        with (
+            exception_handler(
+                connect_url=self._worker_zmq_url,
+                socket_type=zmq.ROUTER,
+                bind=True,
+                and_raise=False,
+                shutdown_on_error=True,
+                codec=self._codec,
+            ) as router_socket,
+            exception_handler(
+                connect_url=self._results_zmq_url,
+                socket_type=zmq.PULL,
+                and_raise=False,
+                shutdown_on_error=True,
+            ) as results_socket,
+        ):
+            poller = zmq.Poller()
+            poller.register(results_socket, zmq.POLLIN)
+            poller.register(router_socket, zmq.POLLIN)
+            accepting = True
+            in_flight = 0
+            try:
+                while not threads.shutting_down:
+                    for socket, _ in poller.poll(timeout=1000):
+                        if socket is results_socket:
+                            frames = results_socket.recv_multipart()
+                            in_flight -= 1
+                            if len(frames) == 1 and self._error is not None:
+                                raise self._error
+                            router_socket.send_multipart(frames)
+                        else:
+                            frames = router_socket.recv_multipart()
+                            in_flight += 1
+                            # the envelope is everything but the request body
+                            split = len(frames) - self._body_frames
+                            executor.submit(self._handle, frames[:split], frames[split:])
+                    if accepting and in_flight >= self._max_in_flight:
+                        poller.unregister(router_socket)
+                        accepting = False
+                    elif not accepting and in_flight < self._max_in_flight:
+                        poller.register(router_socket, zmq.POLLIN)
+                        accepting = True
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+                for handler_socket in self._handler_sockets:
+                    try_close(handler_socket)
+                self._handler_sockets.clear()
+
+
+class PipelinedZmqClient(Closable):
+    """DEALER client for PipelinedZmqWorker that keeps many requests outstanding."""
+
+    def __init__(self, connect_url: str, codec: str | None = None):
+        Closable.__init__(
+            self, connect_url=connect_url, socket_type=zmq.DEALER, bind=False, codec=codec
+        )
+        self._next_request_id = 0
+
+    def send(self, message) -> int:
+        request_id = self._next_request_id
+        self._next_request_id += 1
+        socket = self.get_socket()
+        socket.send_multipart([b"", request_id.to_bytes(8, "big"), *dump_obj(socket, message)])
+        return request_id
+
+    def recv(self, timeout_ms: int | None = None):
+        socket = self.get_socket()
+        if timeout_ms is not None and socket.poll(timeout=timeout_ms) == 0:
+            raise TimeoutError("No reply from pipelined worker.")
+        _, request_id, *body = socket.recv_multipart()
+        return int.from_bytes(request_id, "big"), load_obj(socket, body)
+
+    def request_many(self, messages, timeout_ms: int | None = None):
+        request_ids = [self.send(message) for message in messages]
+        responses: dict[int, object] = {}
+        while len(responses) < len(request_ids):
+            request_id, response = self.recv(timeout_ms=timeout_ms)
+            responses[request_id] = response
+        return [responses[request_id] for request_id in request_ids]
+
+
+class AsyncZmqRelay(Closable):
+    """asyncio counterpart of ZmqRelay, run as a coroutine by an AsyncAppThread."""
+
+    def __init__(self, name, source_zmq_url, sink_zmq_url, codec: str | None = None):
+        Closable.__init__(self, connect_url=source_zmq_url, is_async=True, codec=codec)
+        self.name = name
+        self._sink_zmq_url = sink_zmq_url
+
+    async def process_message(self, sink_socket):
+        data = await recv_obj_async(self.socket)
+        payload = make_payload(data=data)
+        # do not info on heartbeats
+        if "device_info" not in data:
+            log_debug(
+                "Relaying message",
+                lambda: {
+                    "message_bytes": len(data),
+                    "source_url": self.socket_url,
+                    "sink_url": self._sink_zmq_url,
+                    "payload_bytes": len(payload),
+                },
+            )
+        await sink_socket.send(payload)
+
+    async def startup(self):
+        pass
+
+    async def run(self):
+        await self.startup()
+        self.get_socket()
+        with exception_handler(
+            connect_url=self._sink_zmq_url,
+            and_raise=False,
+            shutdown_on_error=True,
+            is_async=True,
+        ) as socket:
+            while not threads.shutting_down:
+                if await self.socket.poll(timeout=1000) == 0:  # type: ignore
+                    continue
+                await self.process_message(sink_socket=socket)
+        self.close()
+
+
+class AsyncZmqWorker:
+    """asyncio counterpart of ZmqWorker with concurrent in-flight requests.
+
+    A ROUTER socket is bound at the worker URL so that REQ callers are
+    unaffected; each request is handled by its own process_message task and
+    replies are sent as they complete, up to max_in_flight at a time.
+    """
+
+    def __init__(self, name: str, worker_zmq_url: str, max_in_flight: int = 100):
+        self.name = name
+        self._worker_zmq_url = worker_zmq_url
+        self._max_in_flight = max_in_flight
+        self._error: BaseException | None = None
+
+    async def process_message(self, message: dict[str, object]) -> dict[str, object]:
+        raise NotImplementedError()
+
+    async def startup(self):
+        pass
+
+    async def _handle(self, zmq_socket, frames, in_flight):
+        try:
+            # frames are the ROUTER envelope followed by the pickled request
+            message = pickle.loads(frames[-1])
+            response = await self.process_message(message=message)
+            await zmq_socket.send_multipart(
+                frames[:-1] + [pickle.dumps(response, pickle.DEFAULT_PROTOCOL)]
+            )
+        except Exception as e:
+            # surfaced to exception_handler by the receive loop
+            if self._error is None:
+                self._error = e
+        finally:
+            in_flight.release()
+
+    async def run(self):
+        await self.startup()
+        in_flight = asyncio.Semaphore(self._max_in_flight)
+        tasks: set[asyncio.Task] = set()  # type: ignore[type-arg]
+        with exception_handler(
+            connect_url=self._worker_zmq_url,
+            socket_type=zmq.ROUTER,
+            bind=True,
+            and_raise=False,
+            shutdown_on_error=True,
+            is_async=True,
+        ) as zmq_socket:
+            try:
+                while not threads.shutting_down:
+                    if self._error is not None:
+                        raise self._error
+                    if await zmq_socket.poll(timeout=1000) == 0:
+                        continue
+                    frames = await zmq_socket.recv_multipart()
+                    await in_flight.acquire()
+                    task = asyncio.create_task(self._handle(zmq_socket, frames, in_flight))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            finally:
+                if tasks:
+                    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class AsyncAppThread(AppThread):
+    """Tracked thread running the run() coroutines of async workers and relays on one event loop."""
+
+    def __init__(self, name, runners):
+        AppThread.__init__(self, name=name)
+        self._runners = runners
+
+    async def _run_all(self):
+        await asyncio.gather(*[runner.run() for runner in self._runners])
+
+    def run(self):
+        asyncio.run(self._run_all())
+
+
+@cache
+def _thread_state():
+    # thread state that cannot (and need not) cross a process boundary; the name and
+    # daemon flag are kept to initialise the unpickled copy as a Thread again
+    return frozenset(vars(Thread()).keys()) - {"_name", "_daemonic"}
+
+
+def _process_worker_main(worker, backend_zmq_url, config, log_level):
+    # spawned interpreters re-import the package, so apply the parent's runtime view
+    app_config.read_dict(config)
+    log.setLevel(log_level)
+    worker.process_startup()
+    parent = multiprocessing.parent_process()
+    with exception_handler(
+        connect_url=backend_zmq_url,
+        socket_type=zmq.REP,
+        bind=False,
+        and_raise=False,
+        shutdown_on_error=True,
+        codec=worker.codec,
+    ) as zmq_socket:
+        while not threads.shutting_down and (parent is None or parent.is_alive()):
+            if zmq_socket.poll(timeout=1000) == 0:
+                continue
+            message = recv_obj(zmq_socket)
+            response = worker.process_message(message=message)
+            send_obj(zmq_socket, response)
+
+
+class ProcessZmqWorker(ZmqWorkerPool):
+    """ZmqWorker variant that serves process_message from child processes.
+
+    Requests arriving on the worker URL are proxied over an ipc:// DEALER socket
+    to pool_size spawned processes. The worker instance is pickled into each
+    child, so process_message must rely only on picklable instance state.
+    """
+
+    def _make_backend_zmq_url(self):
+        return f"ipc://{tempfile.gettempdir()}/{APP_NAME}-worker-{os.getpid()}-{id(self)}"
+
+    def _make_pool_workers(self, pool_size: int):
+        mp_context = multiprocessing.get_context("spawn")
+        pool_workers = []
+        for i in range(pool_size):
+            process_name = f"{self.name} (process {i})"
+            pool_workers.append(
+                mp_context.Process(
+                    name=process_name,
+                    target=_process_worker_main,
+                    args=(
+                        self,
+                        self._backend_zmq_url,
+                        {
+                            section: dict(app_config.items(section, raw=True))
+                            for section in app_config.sections()
+                        },
+                        log.getEffectiveLevel(),
+                    ),
+                    daemon=True,
+                )
+            )
+            # the thread nanny treats tracked child processes like threads
+            threads_tracked.add(process_name)
+        return pool_workers
+
+    def __getstate__(self):
+        state = vars(self).copy()
+        for key in _thread_state():
+            state.pop(key, None)
+        state.pop("_pool_workers", None)
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        # a fresh, unstarted thread, so that name, repr and logging work in the child
+        Thread.__init__(self, name=state.pop("_name"), daemon=state.pop("_daemonic"))
+        self.__dict__.update(state)
+
+    def process_startup(self):
+        pass
+
+    def untrack(self):
+        for pool_worker in self._pool_workers:
+            threads_tracked.discard(pool_worker.name)
+        AppThread.untrack(self)
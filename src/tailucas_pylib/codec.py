@@ -0,0 +1,144 @@
+import json
+import pickle
+from collections.abc import Callable
+from datetime import UTC, datetime
+from functools import partial
+from typing import Any
+
+# wire content types, sent as the leading frame by codec-aware sockets
+CONTENT_TYPE_PICKLE = b"application/x-python-pickle"
+CONTENT_TYPE_MSGPACK = b"application/msgpack"
+CONTENT_TYPE_JSON = b"application/json"
+
+# msgpack extension types; -1 is the msgpack timestamp type that umsgpack also uses
+EXT_TIMESTAMP = -1
+EXT_DEVICE = 1
+
+
+class ContentTypeMismatch(ValueError):
+    pass
+
+
+class Codec:
+    def __init__(
+        self,
+        name: str,
+        content_type: bytes,
+        dumps: Callable[[object], bytes],
+        loads: Callable[[bytes], object],
+    ):
+        self.name = name
+        self.content_type = content_type
+        self.dumps = dumps
+        self.loads = loads
+
+    def __repr__(self):
+        return f"Codec({self.name})"
+
+
+def _pickle_codec():
+    return Codec(
+        name="pickle",
+        content_type=CONTENT_TYPE_PICKLE,
+        dumps=lambda obj: pickle.dumps(obj, pickle.DEFAULT_PROTOCOL),
+        loads=pickle.loads,
+    )
+
+
+def _device_type():
+    try:
+        from .device import Device  # optional 'dto' extra
+    except ImportError:
+        return None
+    return Device
+
+
+def _device_fields(device) -> dict[str, Any]:
+    return device.model_dump(by_alias=True, exclude_none=True)
+
+
+def _umsgpack_codec(name: str = "umsgpack"):
+    import umsgpack  # optional 'mq' extra
+
+    # datetime is packed as the timestamp extension natively
+    pack_handlers = {}
+    unpack_handlers = {}
+    device_type = _device_type()
+    if device_type is not None:
+        pack_handlers[device_type] = lambda device: umsgpack.Ext(
+            EXT_DEVICE, umsgpack.packb(_device_fields(device))
+        )
+        unpack_handlers[EXT_DEVICE] = lambda ext: device_type.model_validate(
+            umsgpack.unpackb(ext.data)
+        )
+    return Codec(
+        name=name,
+        content_type=CONTENT_TYPE_MSGPACK,
+        dumps=partial(umsgpack.packb, ext_handlers=pack_handlers),
+        loads=partial(umsgpack.unpackb, ext_handlers=unpack_handlers),
+    )
+
+
+def _msgpack_codec():
+    try:
+        import msgpack  # C extension, not part of any extra
+    except ImportError:
+        # same wire format, so fall back to the pure-Python implementation
+        return _umsgpack_codec(name="msgpack")
+    device_type = _device_type()
+
+    def default(obj):
+        if isinstance(obj, datetime):
+            # umsgpack packs naive datetimes as UTC
+            if obj.tzinfo is None:
+                obj = obj.replace(tzinfo=UTC)
+            return msgpack.Timestamp.from_datetime(obj)
+        if device_type is not None and isinstance(obj, device_type):
+            return msgpack.ExtType(EXT_DEVICE, dumps(_device_fields(obj)))
+        raise TypeError(f"Cannot serialize {type(obj).__name__} with msgpack.")
+
+    def ext_hook(code, data):
+        if code == EXT_DEVICE and device_type is not None:
+            return device_type.model_validate(loads(data))
+        return msgpack.ExtType(code, data)
+
+    dumps = partial(msgpack.packb, default=default)
+    loads = partial(msgpack.unpackb, strict_map_key=False, timestamp=3, ext_hook=ext_hook)
+    return Codec(name="msgpack", content_type=CONTENT_TYPE_MSGPACK, dumps=dumps, loads=loads)
+
+
+def _json_codec():
+    return Codec(
+        name="json",
+        content_type=CONTENT_TYPE_JSON,
+        dumps=lambda obj: json.dumps(obj, separators=(",", ":")).encode(),
+        loads=json.loads,
+    )
+
+
+# built-in codecs are created on first use so that optional imports stay lazy
+_codec_factories: dict[str, Callable[[], Codec]] = {
+    "pickle": _pickle_codec,
+    "umsgpack": _umsgpack_codec,
+    "msgpack": _msgpack_codec,
+    "json": _json_codec,
+}
+codecs: dict[str, Codec] = {}
+
+
+def register_codec(codec: Codec):
+    codecs[codec.name] = codec
+
+
+def get_codec(name: str) -> Codec:
+    try:
+        return codecs[name]
+    except KeyError:
+        pass
+    try:
+        factory = _codec_factories[name]
+    except KeyError as e:
+        raise AssertionError(f"Unsupported codec: {name}") from e
+    codec = factory()
+    register_codec(codec)
+    return codec
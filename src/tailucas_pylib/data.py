@@ -1,20 +1,181 @@
-import logging
+import zlib
+from collections.abc import Callable
 
-import umsgpack as msgpack
+from . import app_config, log_debug
+from .codec import get_codec
+from .datetime import make_iso_timestamp, utc_iso_now
 
-from . import log
-from .datetime import make_iso_timestamp
+# leading byte of a compressed payload; never produced by msgpack
+COMPRESSED_MARKER = 0xC1
 
+COMPRESSION_ZLIB = "zlib"
+COMPRESSION_LZ4 = "lz4"
+COMPRESSION_ZSTD = "zstd"
 
-def make_payload(timestamp=None, data=None, pack=True):
-    payload = {"timestamp": make_iso_timestamp(timestamp=timestamp)}
+# packed payloads larger than this many bytes are compressed; 0 disables compression
+payload_compress_threshold = app_config.getint("app", "payload_compress_threshold", fallback=0)
+
+
+class Compressor:
+    def __init__(
+        self,
+        name: str,
+        marker: int,
+        compress: Callable[[bytes], bytes],
+        decompress: Callable[[bytes], bytes],
+    ):
+        self.name = name
+        self.marker = marker
+        self.compress = compress
+        self.decompress = decompress
+
+
+def _zlib_compressor():
+    return Compressor(
+        name=COMPRESSION_ZLIB,
+        marker=1,
+        compress=lambda body: zlib.compress(body, 1),
+        decompress=zlib.decompress,
+    )
+
+
+def _lz4_compressor():
+    import lz4.frame  # optional, not part of any extra
+
+    return Compressor(
+        name=COMPRESSION_LZ4,
+        marker=2,
+        compress=lz4.frame.compress,
+        decompress=lz4.frame.decompress,
+    )
+
+
+def _zstd_compressor():
+    import zstandard  # optional, not part of any extra
+
+    compressor = zstandard.ZstdCompressor(level=1)
+    decompressor = zstandard.ZstdDecompressor()
+    return Compressor(
+        name=COMPRESSION_ZSTD,
+        marker=3,
+        compress=compressor.compress,
+        decompress=decompressor.decompress,
+    )
+
+
+_compressor_factories: dict[str, Callable[[], Compressor]] = {
+    COMPRESSION_ZLIB: _zlib_compressor,
+    COMPRESSION_LZ4: _lz4_compressor,
+    COMPRESSION_ZSTD: _zstd_compressor,
+}
+_compressors: dict[str, Compressor] = {}
+# the second header byte names the compression used
+_compression_markers = {1: COMPRESSION_ZLIB, 2: COMPRESSION_LZ4, 3: COMPRESSION_ZSTD}
+
+
+def get_compressor(name: str) -> Compressor:
+    try:
+        return _compressors[name]
+    except KeyError:
+        pass
+    try:
+        factory = _compressor_factories[name]
+    except KeyError as e:
+        raise AssertionError(f"Unsupported compression: {name}") from e
+    compressor = factory()
+    _compressors[name] = compressor
+    return compressor
+
+
+def _configured_compression(name: str) -> str:
+    try:
+        get_compressor(name)
+    except ImportError as e:
+        raise AssertionError(f"Payload compression {name} is not installed.") from e
+    return name
+
+
+# zlib is always available, so every peer can read it; lz4 and zstd must be
+# installed on every receiver before a sender is configured to use them
+payload_compression = _configured_compression(
+    app_config.get("app", "payload_compression", fallback=COMPRESSION_ZLIB)
+)
+
+
+def compress_payload(body: bytes, compression: str = COMPRESSION_ZLIB) -> bytes:
+    """Compress a packed payload behind a two-byte header naming the compression."""
+    compressor = get_compressor(compression)
+    compressed = bytes((COMPRESSED_MARKER, compressor.marker)) + compressor.compress(body)
+    # incompressible payloads are sent as they are
+    return compressed if len(compressed) < len(body) else body
+
+
+def decompress_payload(body: bytes) -> bytes:
+    if not body or body[0] != COMPRESSED_MARKER:
+        return body
+    try:
+        compressor = get_compressor(_compression_markers[body[1]])
+    except (KeyError, ImportError) as e:
+        raise ValueError(f"Unsupported payload compression: {body[1]}") from e
+    try:
+        return compressor.decompress(body[2:])
+    except Exception as e:
+        raise ValueError(f"Bad {compressor.name} payload: {repr(e)}") from e
+
+
+def make_payload(timestamp=None, data=None, pack=True, codec="msgpack", compress_threshold=None):
+    if timestamp is None:
+        payload = {"timestamp": utc_iso_now()}
+    else:
+        payload = {"timestamp": make_iso_timestamp(timestamp=timestamp)}
     if data is not None and len(data) > 0:
         if isinstance(data, dict):
             payload.update(data)
         else:
             payload["data"] = data
-    if log.level == logging.DEBUG:
-        log.debug("Payload created", extra={"payload": payload})
+    log_debug("Payload created", lambda: {"payload": payload})
     if pack:
-        return msgpack.packb(payload)
+        body = get_codec(codec).dumps(payload)
+        if compress_threshold is None:
+            compress_threshold = payload_compress_threshold
+        if compress_threshold and len(body) > compress_threshold:
+            return compress_payload(body, compression=payload_compression)
+        return body
     return payload
+
+
+def unpack_payload(body, codec="msgpack"):
+    """Decode a payload from make_payload, decompressing it first if needed."""
+    return get_codec(codec).loads(decompress_payload(body))
+
+
+def is_packed_map(body) -> bool:
+    """Cheap check that body starts like a msgpack map, as packed by make_payload."""
+    if not body:
+        return False
+    marker = body[0]
+    return 0x80 <= marker <= 0x8F or marker in (0xDE, 0xDF, COMPRESSED_MARKER)
+
+
+class LazyPayload:
+    """A packed payload that is only decoded when its contents are first read."""
+
+    __slots__ = ("body", "_codec", "_value")
+
+    def __init__(self, body, codec="msgpack"):
+        # accept ZMQ frames received without copying
+        self.body = getattr(body, "bytes", body)
+        self._codec = codec
+        self._value = None
+
+    @property
+    def value(self):
+        if self._value is None:
+            self._value = unpack_payload(self.body, codec=self._codec)
+        return self._value
+
+    def __getitem__(self, key):
+        return self.value[key]
+
+    def get(self, key, default=None):
+        return self.value.get(key, default)
@@ -1,10 +1,89 @@
+import time
+from collections.abc import Iterable
 from datetime import datetime
+from functools import cache, lru_cache
 
 import dateutil.parser
 import pytz
 from dateutil import tz
 
-from . import log
+from . import log, log_debug
+
+# lengths of digit strings taken as epoch seconds or milliseconds without trying dateutil
+EPOCH_SECONDS_DIGITS = (9, 10)
+EPOCH_MILLISECONDS_DIGITS = 13
+# dateutil defaults that differ in every date field, to tell a full date from a partial one
+_PARSE_DEFAULTS = (datetime(2000, 1, 1), datetime(2001, 2, 2))
+
+# (epoch second, ISO string) of the last formatted second, replaced as a whole
+_utc_iso_second: tuple[int, str] = (-1, "")
+
+
+def utc_iso_now() -> str:
+    """Current UTC time as an ISO string, formatted once per second and then reused."""
+    global _utc_iso_second
+    now = int(time.time())
+    second, iso_timestamp = _utc_iso_second
+    if now != second:
+        iso_timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now))
+        _utc_iso_second = (now, iso_timestamp)
+    return iso_timestamp
+
+
+@cache
+def local_timezone():
+    return tz.tzlocal()
+
+
+@lru_cache(maxsize=256)
+def _parse_full_date(timestamp: str) -> datetime | None:
+    # parsed results are immutable, so recently seen strings are served from the cache,
+    # but only when they give a full date that does not depend on the day they are parsed
+    first, second = _PARSE_DEFAULTS
+    parsed = dateutil.parser.parse(timestamp, default=first)
+    defaulted = parsed.year == first.year or parsed.month == first.month or parsed.day == first.day
+    # a field may have come from the default; see if another default changes it
+    if defaulted and parsed != dateutil.parser.parse(timestamp, default=second):
+        return None
+    return parsed
+
+
+def _today() -> datetime:
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _parse_with_dateutil(timestamp: str) -> datetime:
+    parsed = _parse_full_date(timestamp)
+    if parsed is None:
+        # missing date parts are taken from today, so partial dates are never cached
+        parsed = dateutil.parser.parse(timestamp, default=_today())
+    return parsed
+
+
+def parse_timestamp(timestamp: str) -> datetime:
+    """Parse ISO 8601 or epoch strings cheaply, falling back to dateutil.
+
+    Only digit strings as long as an epoch in seconds (9 or 10 digits) or
+    milliseconds (13 digits) skip dateutil, so that a bare year still parses as one.
+    """
+    try:
+        return datetime.fromisoformat(timestamp)
+    except ValueError:
+        pass
+    try:
+        if timestamp.isdigit():
+            if len(timestamp) in EPOCH_SECONDS_DIGITS:
+                return datetime.fromtimestamp(int(timestamp), tz=pytz.utc)
+            if len(timestamp) == EPOCH_MILLISECONDS_DIGITS:
+                return datetime.fromtimestamp(int(timestamp) / 1000, tz=pytz.utc)
+            try:
+                return _parse_with_dateutil(timestamp)
+            except ValueError:
+                # as before, digits that are not a date are taken as epoch seconds
+                return datetime.fromtimestamp(int(timestamp), tz=pytz.utc)
+        return _parse_with_dateutil(timestamp)
+    except (OverflowError, OSError) as e:
+        raise ValueError(f"Timestamp out of range: {timestamp}") from e
 
 
 def make_timestamp(
@@ -14,35 +93,28 @@ def make_timestamp(
         timestamp = datetime.fromtimestamp(timestamp, tz=pytz.utc)
     elif isinstance(timestamp, str):
         try:
-            log.debug("Attempting to parse timestamp", extra={"timestamp": timestamp})
-            timestamp = dateutil.parser.parse(timestamp)
-            log.debug("Parsed timestamp", extra={"timestamp": str(timestamp)})
+            log_debug("Attempting to parse timestamp", lambda: {"timestamp": timestamp})
+            timestamp = parse_timestamp(timestamp)
+            log_debug("Parsed timestamp", lambda: {"timestamp": str(timestamp)})
         except ValueError:
-            # try integer representation
-            try:
-                timestamp = datetime.fromtimestamp(int(timestamp), tz=pytz.utc)  # type: ignore
-                log.debug("Parsed integer timestamp", extra={"timestamp": str(timestamp)})
-            except ValueError:
-                log.exception(
-                    "Unable to parse timestamp. Using 'now'.", extra={"timestamp": timestamp}
-                )
-                timestamp = None
+            log.exception("Unable to parse timestamp. Using 'now'.", extra={"timestamp": timestamp})
+            timestamp = None
     if timestamp is None:
         timestamp = datetime.now()
-        log.debug("Generated new timestamp", extra={"timestamp": str(timestamp)})
+        log_debug("Generated new timestamp", lambda: {"timestamp": str(timestamp)})
     if timestamp.tzinfo is None:  # type: ignore
-        local_tz = tz.tzlocal()
+        local_tz = local_timezone()
         # we use the default specific to the physical locality of the devices
         timestamp = timestamp.replace(tzinfo=local_tz)  # type: ignore
-        log.debug(
+        log_debug(
             "Applying local timezone to timestamp because no TZ is set",
-            extra={"timezone": timestamp.tzname(), "timestamp": str(timestamp)},  # type: ignore[union-attr]
+            lambda: {"timezone": timestamp.tzname(), "timestamp": str(timestamp)},  # type: ignore[union-attr]
         )
         # now adjust to requested TZ
         new_timestamp = timestamp.astimezone(tz=as_tz)  # type: ignore[union-attr]
-        log.debug(
+        log_debug(
             "Timestamp adjusted to requested timezone",
-            extra={
+            lambda: {
                 "timestamp": str(timestamp),
                 "new_timestamp": str(new_timestamp),
                 "from_timezone": timestamp.tzname(),  # type: ignore[union-attr]
@@ -50,28 +122,97 @@ def make_timestamp(
             },
         )
         timestamp = new_timestamp
-    log.debug("Final timestamp", extra={"timestamp": str(timestamp)})
+    log_debug("Final timestamp", lambda: {"timestamp": str(timestamp)})
     return timestamp  # type: ignore
 
 
 def make_iso_timestamp(
     timestamp: float | int | str | datetime | None = None, as_tz=pytz.utc
 ) -> str:
+    if timestamp is None and as_tz is pytz.utc:
+        return utc_iso_now()
     iso_timestamp = (
         make_timestamp(timestamp=timestamp, as_tz=as_tz)
         .replace(microsecond=0)
         .isoformat()
         .replace("+00:00", "Z")
     )
-    log.debug("ISO timestamp", extra={"iso_timestamp": iso_timestamp})
+    log_debug("ISO timestamp", lambda: {"iso_timestamp": iso_timestamp})
     return iso_timestamp
 
 
 def make_unix_timestamp(
     timestamp: float | int | str | datetime | None = None, as_tz=pytz.utc
 ) -> int:
+    if isinstance(timestamp, float | int) and as_tz is pytz.utc:
+        # already seconds since the epoch
+        return int(timestamp)
     return int(
         (
             make_timestamp(timestamp=timestamp, as_tz=as_tz) - datetime(1970, 1, 1, tzinfo=as_tz)
         ).total_seconds()
     )
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _epoch_array(np, timestamps):
+    if not isinstance(timestamps, np.ndarray):
+        if not isinstance(timestamps, list | tuple):
+            return None
+        timestamps = np.asarray(timestamps)
+    # strings, datetimes and None keep their scalar semantics
+    return timestamps if timestamps.dtype.kind in "iuf" else None
+
+
+def _scalars(np, timestamps):
+    # the scalar functions expect Python numbers rather than NumPy scalars
+    if np is None:
+        return timestamps
+    if isinstance(timestamps, np.ndarray):
+        return timestamps.tolist()
+    return (t.item() if isinstance(t, np.generic) else t for t in timestamps)
+
+
+def make_unix_timestamps(timestamps: Iterable[float | int | str | datetime | None], as_tz=pytz.utc):
+    """Batch variant of make_unix_timestamp.
+
+    Numeric UTC input is converted with NumPy when it is installed, returning an
+    int64 array. Anything else goes through the scalar function element by
+    element, returning an array when NumPy is installed and a list otherwise.
+    """
+    np = _numpy()
+    if np is not None and as_tz is pytz.utc:
+        epochs = _epoch_array(np, timestamps)
+        if epochs is not None:
+            return np.trunc(epochs).astype(np.int64)
+    unix_timestamps = [
+        make_unix_timestamp(timestamp, as_tz=as_tz) for timestamp in _scalars(np, timestamps)
+    ]
+    return np.array(unix_timestamps, dtype=np.int64) if np else unix_timestamps
+
+
+def make_iso_timestamps(timestamps: Iterable[float | int | str | datetime | None], as_tz=pytz.utc):
+    """Batch variant of make_iso_timestamp.
+
+    Numeric UTC input is formatted with NumPy when it is installed, returning a
+    string array. Anything else goes through the scalar function element by
+    element, returning an array when NumPy is installed and a list otherwise.
+    """
+    np = _numpy()
+    if np is not None and as_tz is pytz.utc:
+        epochs = _epoch_array(np, timestamps)
+        if epochs is not None:
+            # datetime.fromtimestamp rounds to the microsecond before the scalar path truncates
+            seconds = np.floor(np.round(epochs, 6)).astype(np.int64).astype("datetime64[s]")
+            return np.char.add(np.datetime_as_string(seconds, unit="s"), "Z")
+    iso_timestamps = [
+        make_iso_timestamp(timestamp, as_tz=as_tz) for timestamp in _scalars(np, timestamps)
+    ]
+    return np.array(iso_timestamps, dtype=str) if np else iso_timestamps
@@ -6,7 +6,7 @@ from zmq.error import ContextTerminated
 
 from . import log, threads
 from .threads import die
-from .zmq import try_close, zmq_socket
+from .zmq import SocketOptions, try_close, zmq_socket
 
 
 class exception_handler(ContextManager["exception_handler"]):
@@ -18,6 +18,9 @@ class exception_handler(ContextManager["exception_handler"]):
         close_on_exit: bool | None = True,
         shutdown_on_error: bool | None = False,
         is_async: bool | None = False,
+        bind: bool | None = None,
+        codec: str | None = None,
+        options: SocketOptions | None = None,
     ):
         self._zmq_socket = None
         self._zmq_url = connect_url
@@ -26,14 +29,22 @@ class exception_handler(ContextManager["exception_handler"]):
         self._close_on_exit = close_on_exit
         self._shutdown_on_error = shutdown_on_error
         self._is_async = is_async
+        self._bind = bind
+        self._codec = codec
+        self._options = options
 
     def __enter__(self):
         self._zmq_socket = zmq_socket(
             socket_type=self._socket_type,  # type: ignore
             is_async=self._is_async,
+            codec=self._codec,
+            options=self._options,
         )
         assert self._zmq_socket is not None
-        if self._socket_type in [zmq.PULL, zmq.PUB, zmq.REP]:
+        bind = self._bind
+        if bind is None:
+            bind = self._socket_type in [zmq.PULL, zmq.PUB, zmq.REP]
+        if bind:
             log.debug(
                 "Binding ZMQ socket",
                 extra={
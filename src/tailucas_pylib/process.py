@@ -2,7 +2,7 @@ import logging
 import signal
 import subprocess
 
-from . import log
+from . import log, refresh_log_level
 from .threads import die
 
 
@@ -39,6 +39,7 @@ class SignalHandler:
             log.setLevel(logging.DEBUG)
         elif log.getEffectiveLevel() == logging.DEBUG:
             log.setLevel(logging.INFO)
+        refresh_log_level()
 
     def terminate(self, signum, frame):
         log.debug("Signal received", extra={"signal": signum})
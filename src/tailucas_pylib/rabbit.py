@@ -1,18 +1,30 @@
+import re
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import ExitStack
+from functools import partial
+from threading import Lock, Thread, get_ident
+
 import pika
-import umsgpack as msgpack
 import zmq
 from pika.exceptions import (
+    AMQPChannelError,
     AMQPConnectionError,
+    AMQPError,
     ConnectionClosedByBroker,
     StreamLostError,
 )
 from sentry_sdk.integrations.logging import ignore_logger
 from umsgpack import UnpackException
 
-from . import log, threads
+from . import app_config, log, log_debug, threads
 from .app import AppThread
-from .data import make_payload
+from .data import LazyPayload, is_packed_map, make_payload, unpack_payload
 from .handler import exception_handler
+from .spool import SPOOL_SIZE, Spool
+from .zmq import recv_batch, recv_obj, send_obj
 
 # Reduce Sentry noise from pika loggers
 ignore_logger("pika.adapters.base_connection")
@@ -26,6 +38,540 @@ ignore_logger("pika.connection")
 
 BLOCKED_CONNECTION_TIMEOUT = 5
 PUBLISH_RETRIES = 3
+CONFIRM_WINDOW = 100
+CONFIRM_TIMEOUT = 10
+
+# bridge engines
+ENGINE_BLOCKING = "blocking"
+ENGINE_SELECT = "select"
+ENGINES = (ENGINE_BLOCKING, ENGINE_SELECT)
+
+# default engine, chosen per deployment
+mq_engine = app_config.get("app", "mq_engine", fallback=ENGINE_BLOCKING)
+# share connections and declarations between MQConnection instances
+mq_pooling = app_config.getboolean("app", "mq_connection_pool", fallback=False)
+
+SHUTDOWN_CHECK_SECS = 1
+DRAIN_LIMIT = 100
+ACK_INTERVAL_MS = 100
+TOPIC_CACHE_SIZE = 4096
+SPOOL_DRAIN_RATE = 100
+SPOOL_RETRY_SECS = 5
+SPOOL_POLL_MS = 100
+# publishes held by a SelectEngine until its channel is ready
+SELECT_PENDING_LIMIT = 10000
+
+# raised by a publish on a lost connection or channel
+PUBLISH_ERRORS = (AMQPConnectionError, AMQPChannelError)
+
+# raised when decoding a malformed or undecompressable payload; the C msgpack
+# codec raises ValueError and its umsgpack fallback UnpackException
+BAD_PAYLOAD_ERRORS = (UnpackException, ValueError)
+
+
+def _check_engine(engine):
+    if engine is None:
+        engine = mq_engine
+    if engine not in ENGINES:
+        raise AssertionError(f"Unsupported engine: {engine}")
+    return engine
+
+
+class ConfirmedPublisher:
+    """Pipelined publishing with RabbitMQ publisher confirms.
+
+    Up to window messages are kept unconfirmed, keyed by delivery tag, while
+    acks and nacks are collected from the connection's event loop. Nacked
+    messages, and messages still unconfirmed when a channel is lost, are
+    published again on the next channel, up to max_attempts times each.
+    A full window that does not drain within confirm_timeout, or whose channel
+    closes, raises ResourceWarning without sending the new message. Once sent,
+    a message is the publisher's to deliver: losing the connection afterwards
+    does not raise, and the message is published again from the retry list.
+    """
+
+    def __init__(
+        self,
+        window: int = CONFIRM_WINDOW,
+        max_attempts: int = PUBLISH_RETRIES,
+        confirm_timeout: float = CONFIRM_TIMEOUT,
+    ):
+        self._window = window
+        self._max_attempts = max_attempts
+        self._confirm_timeout = confirm_timeout
+        self._connection = None
+        self._channel = None
+        self._delivery_tag = 0
+        # delivery tag -> (exchange, routing key, body, attempts)
+        self._unconfirmed: OrderedDict = OrderedDict()  # type: ignore[type-arg]
+        self._retry: list = []  # type: ignore[type-arg]
+        self.acked = 0
+        self.nacked = 0
+        self.dropped = 0
+
+    @property
+    def pending(self):
+        return len(self._unconfirmed) + len(self._retry)
+
+    def attach(self, connection, channel):
+        # anything unconfirmed on a previous channel is presumed lost
+        self.reset()
+        self._connection = connection
+        self._channel = channel
+        self._delivery_tag = 0
+        selected = []
+        # the blocking adapter would confirm synchronously; use its underlying channel
+        channel._impl.confirm_delivery(
+            ack_nack_callback=self._on_confirm, callback=lambda frame: selected.append(frame)
+        )
+        while not selected and channel.is_open:
+            connection.process_data_events(time_limit=1)
+
+    def reset(self):
+        self._retry.extend(self._unconfirmed.values())
+        self._unconfirmed.clear()
+        self._channel = None
+
+    def _on_confirm(self, frame):
+        method = frame.method
+        if method.multiple:
+            tags = [tag for tag in self._unconfirmed if tag <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag]
+        is_ack = isinstance(method, pika.spec.Basic.Ack)
+        for tag in tags:
+            message = self._unconfirmed.pop(tag, None)
+            if message is None:
+                continue
+            if is_ack:
+                self.acked += 1
+            else:
+                self.nacked += 1
+                self._retry.append(message)
+
+    def _send(self, exchange, routing_key, body, attempts):
+        if attempts >= self._max_attempts:
+            self.dropped += 1
+            log.warning(
+                "Dropping message after repeated publish failures",
+                extra={"exchange_name": exchange, "routing_key": routing_key, "attempts": attempts},
+            )
+            return
+        deadline = time.monotonic() + self._confirm_timeout
+        while len(self._unconfirmed) >= self._window:
+            if self._channel is None or not self._channel.is_open:
+                # the unconfirmed messages are published again on the next channel
+                self.reset()
+                raise ResourceWarning("Channel closed while waiting for publisher confirms.")
+            if time.monotonic() >= deadline:
+                self.reset()
+                raise ResourceWarning(
+                    f"No publisher confirms within {self._confirm_timeout} seconds."
+                )
+            self._connection.process_data_events(time_limit=1)  # type: ignore
+        self._channel._impl.basic_publish(  # type: ignore
+            exchange=exchange, routing_key=routing_key, body=body
+        )
+        self._delivery_tag += 1
+        self._unconfirmed[self._delivery_tag] = (exchange, routing_key, body, attempts + 1)
+
+    def _republish(self):
+        while self._retry:
+            message = self._retry.pop(0)
+            try:
+                self._send(*message)
+            except Exception:
+                # still ours to deliver once a channel is attached again
+                self._retry.insert(0, message)
+                raise
+
+    def publish(self, exchange, routing_key, body):
+        if self._retry:
+            self._republish()
+        self._send(exchange, routing_key, body, attempts=0)
+        try:
+            # flush the frame and collect any confirms without blocking
+            self._connection.process_data_events(time_limit=0)  # type: ignore
+        except PUBLISH_ERRORS:
+            # the message is ours once sent, so only the retry list publishes it again
+            log.debug(self.__class__.__name__, exc_info=True)
+            self.reset()
+
+    def flush(self, timeout: float = CONFIRM_TIMEOUT) -> int:
+        deadline = time.monotonic() + timeout
+        while self.pending > 0 and time.monotonic() < deadline:
+            if self._channel is None or not self._channel.is_open:
+                self.reset()
+                break
+            if self._retry:
+                self._republish()
+            try:
+                self._connection.process_data_events(time_limit=0.1)  # type: ignore
+            except PUBLISH_ERRORS:
+                log.debug(self.__class__.__name__, exc_info=True)
+                self.reset()
+                break
+        return self.pending
+
+
+class SelectEngine:
+    """One pika SelectConnection I/O loop shared by consuming, publishing and ZMQ sources.
+
+    Nothing on the loop waits for a broker round trip: publishes are buffered
+    frames, consumed messages arrive as callbacks and registered ZMQ sockets
+    are drained when their file descriptor signals. The loop runs on the
+    calling thread until the connection closes, trying each of the given
+    connection parameters in turn until one opens. Publishes made before the
+    channel is ready are held, up to SELECT_PENDING_LIMIT, and sent once it is.
+    """
+
+    def __init__(self, parameters, exchange_name, exchange_type, exchange_arguments=None):
+        self._parameters = tuple(parameters)
+        self._exchange_name = exchange_name
+        self._exchange_type = exchange_type
+        self._exchange_arguments = exchange_arguments
+        self._connection = None
+        self._channel = None
+        self._opened = False
+        self._stopping = False
+        self._error = None
+        self._consumer = None
+        self._prefetch_count = 0
+        self._zmq_sources: list = []  # type: ignore[type-arg]
+        self._ready = False
+        self._pending: deque = deque()  # type: ignore[type-arg]
+        self.dropped = 0
+        self.queue_name = None
+
+    @property
+    def is_ready(self):
+        return self._ready and self._channel is not None and self._channel.is_open
+
+    def consume(self, topic_filter, on_message_callback, prefetch_count=0):
+        """Consume from an exclusive queue, leaving acks to the caller when prefetching."""
+        self._consumer = (topic_filter, on_message_callback)
+        self._prefetch_count = prefetch_count
+
+    def call_later(self, delay, callback):
+        self._connection.ioloop.call_later(delay, callback)  # type: ignore
+
+    def add_zmq_source(self, socket, handler):
+        """Call handler(socket) for each message readable on socket once the channel is ready."""
+        self._zmq_sources.append((socket, handler))
+
+    def publish(self, routing_key, body):
+        # only from the loop thread; see publish_threadsafe
+        if not self.is_ready:
+            if len(self._pending) >= SELECT_PENDING_LIMIT:
+                self.dropped += 1
+                log.warning(
+                    "RabbitMQ channel not ready, dropping message",
+                    extra={"routing_key": routing_key, "dropped": self.dropped},
+                )
+                return
+            self._pending.append((routing_key, body))
+            return
+        self._channel.basic_publish(  # type: ignore
+            exchange=self._exchange_name, routing_key=routing_key, body=body
+        )
+
+    def publish_threadsafe(self, routing_key, body):
+        if self._connection is None:
+            raise ResourceWarning("RabbitMQ I/O loop is not running.")
+        self._connection.ioloop.add_callback_threadsafe(
+            partial(self.publish, routing_key=routing_key, body=body)
+        )
+
+    def run(self):
+        for parameters in self._parameters:
+            if self._stopping:
+                break
+            self._connection = pika.SelectConnection(
+                parameters=parameters,
+                on_open_callback=self._on_connection_open,
+                on_open_error_callback=self._on_connection_open_error,
+                on_close_callback=self._on_connection_closed,
+            )
+            self._connection.ioloop.start()  # type: ignore
+            if self._opened:
+                break
+        if self._error is not None and not self._stopping and not threads.shutting_down:
+            raise ResourceWarning(f"RabbitMQ I/O loop interrupted: {repr(self._error)}") from (
+                self._error
+            )
+
+    def stop(self):
+        self._stopping = True
+        if self._connection is not None:
+            self._connection.ioloop.add_callback_threadsafe(self._close)
+
+    def _close(self):
+        if self._connection.is_open:  # type: ignore
+            log.debug("Closing RabbitMQ connection...")
+            self._connection.close()  # type: ignore
+
+    def _check_shutdown(self):
+        if threads.shutting_down:
+            self._stopping = True
+        if self._stopping:
+            self._close()
+        else:
+            self.call_later(SHUTDOWN_CHECK_SECS, self._check_shutdown)
+
+    def _on_connection_open(self, connection):
+        self._opened = True
+        connection.ioloop.call_later(SHUTDOWN_CHECK_SECS, self._check_shutdown)
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_open_error(self, connection, error):
+        log.debug("RabbitMQ connection failed", extra={"error": repr(error)})
+        self._error = error
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection, reason):
+        if not self._stopping:
+            self._error = reason
+        self._ready = False
+        self._channel = None
+        if self._pending:
+            log.warning(
+                "RabbitMQ connection closed with unsent messages",
+                extra={"unsent": len(self._pending)},
+            )
+        for socket, _ in self._zmq_sources:
+            try:
+                connection.ioloop.remove_handler(socket.getsockopt(zmq.FD))
+            except Exception:
+                log.debug(self.__class__.__name__, exc_info=True)
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, channel):
+        self._channel = channel
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.exchange_declare(
+            exchange=self._exchange_name,
+            exchange_type=self._exchange_type,
+            arguments=self._exchange_arguments,
+            callback=self._on_exchange_declared,
+        )
+
+    def _on_channel_closed(self, channel, reason):
+        self._ready = False
+        # a channel is only closed by the broker or by closing the connection
+        if not self._stopping:
+            self._error = reason
+            self._close()
+
+    def _on_exchange_declared(self, frame):
+        if self._consumer is None:
+            self._on_ready()
+            return
+        self._channel.queue_declare(  # type: ignore
+            queue="", exclusive=True, callback=self._on_queue_declared
+        )
+
+    def _on_queue_declared(self, frame):
+        self.queue_name = frame.method.queue
+        self._channel.queue_bind(  # type: ignore
+            queue=self.queue_name,
+            exchange=self._exchange_name,
+            routing_key=self._consumer[0],  # type: ignore
+            callback=self._on_queue_bound,
+        )
+
+    def _on_queue_bound(self, frame):
+        if self._prefetch_count:
+            self._channel.basic_qos(  # type: ignore
+                prefetch_count=self._prefetch_count, callback=self._on_qos
+            )
+            return
+        self._on_qos(frame)
+
+    def _on_qos(self, frame):
+        self._channel.basic_consume(  # type: ignore
+            queue=self.queue_name,
+            on_message_callback=self._consumer[1],  # type: ignore
+            auto_ack=not self._prefetch_count,
+        )
+        self._on_ready()
+
+    def _on_ready(self):
+        log.debug(
+            "RabbitMQ I/O loop ready",
+            extra={"exchange_name": self._exchange_name, "queue_name": self.queue_name},
+        )
+        self._ready = True
+        while self._pending:
+            routing_key, body = self._pending.popleft()
+            self.publish(routing_key=routing_key, body=body)
+        ioloop = self._connection.ioloop  # type: ignore
+        for socket, handler in self._zmq_sources:
+            drain = partial(self._drain, socket, handler)
+            ioloop.add_handler(
+                socket.getsockopt(zmq.FD), lambda fd, events, d=drain: d(), ioloop.READ
+            )
+            # the ZMQ descriptor is edge-triggered, so collect anything already queued
+            drain()
+
+    def _drain(self, socket, handler):
+        if not self.is_ready:
+            return
+        for _ in range(DRAIN_LIMIT):
+            if not socket.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+                return
+            handler(socket)
+        # leave room for broker I/O and come back for the rest
+        self._connection.ioloop.call_later(0, partial(self._drain, socket, handler))  # type: ignore
+
+
+class PooledConnection:
+    """A BlockingConnection shared between threads, with its idle channels and declared exchanges.
+
+    A blocking connection must only be driven by one thread, so the connection
+    is opened and its events processed by an I/O thread of its own. Other
+    threads hand work to it with call, which runs on the I/O thread through
+    add_callback_threadsafe and waits for the result.
+    """
+
+    def __init__(self, parameters):
+        self.exchanges: set = set()  # type: ignore[type-arg]
+        self.leases = 0
+        self._idle_channels: list = []  # type: ignore[type-arg]
+        self._closing = False
+        opened: Future = Future()  # type: ignore[type-arg]
+        self._thread = Thread(
+            target=self._run, args=(parameters, opened), name="RabbitMQ pool I/O", daemon=True
+        )
+        self._thread.start()
+        self.connection = opened.result()
+
+    @property
+    def is_open(self):
+        return self.connection.is_open and self._thread.is_alive()
+
+    def _run(self, parameters, opened):
+        try:
+            connection = pika.BlockingConnection(parameters=parameters)
+        except Exception as e:
+            opened.set_exception(e)
+            return
+        opened.set_result(connection)
+        try:
+            while not self._closing and connection.is_open:
+                connection.process_data_events(time_limit=SHUTDOWN_CHECK_SECS)
+        except AMQPError:
+            log.debug(self.__class__.__name__, exc_info=True)
+        if connection.is_open:
+            log.debug("Closing pooled RabbitMQ connection...")
+            try:
+                connection.close()
+            except Exception:
+                log.debug(self.__class__.__name__, exc_info=True)
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn on the I/O thread, returning its result or raising its exception."""
+        if self._thread.ident == get_ident():
+            return fn(*args, **kwargs)
+        done: Future = Future()  # type: ignore[type-arg]
+
+        def run():
+            if done.set_running_or_notify_cancel():
+                try:
+                    done.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    done.set_exception(e)
+
+        if not self.is_open:
+            raise AMQPConnectionError("Pooled connection is closed.")
+        self.connection.add_callback_threadsafe(run)
+        try:
+            return done.result(timeout=BLOCKED_CONNECTION_TIMEOUT)
+        except FutureTimeoutError as e:
+            done.cancel()
+            raise AMQPConnectionError("No response from the pooled connection.") from e
+
+    def lease_channel(self):
+        return self.call(self._lease_channel)
+
+    def _lease_channel(self):
+        self.leases += 1
+        while self._idle_channels:
+            channel = self._idle_channels.pop()
+            if channel.is_open:
+                return channel
+        return self.connection.channel()
+
+    def release_channel(self, channel, reuse=True):
+        self.call(self._release_channel, channel, reuse)
+
+    def _release_channel(self, channel, reuse):
+        self.leases -= 1
+        # channels left consuming or in an unknown state are not handed out again
+        if reuse and channel.is_open and not channel.consumer_tags:
+            self._idle_channels.append(channel)
+        elif channel.is_open:
+            channel.close()
+
+    def declare_exchange(self, channel, exchange, exchange_type, arguments=None):
+        return self.call(self._declare_exchange, channel, exchange, exchange_type, arguments)
+
+    def _declare_exchange(self, channel, exchange, exchange_type, arguments):
+        key = (exchange, exchange_type, tuple(sorted((arguments or {}).items())))
+        if key in self.exchanges:
+            return False
+        channel.exchange_declare(
+            exchange=exchange, exchange_type=exchange_type, arguments=arguments
+        )
+        self.exchanges.add(key)
+        return True
+
+    def close(self):
+        self._closing = True
+        if self._thread.ident != get_ident():
+            self._thread.join(timeout=SHUTDOWN_CHECK_SECS * 2)
+
+
+class ConnectionPool:
+    """Process-wide BlockingConnections, keyed by server list.
+
+    Instances publishing to the same servers share one connection, whichever
+    thread they run on, channels are leased from it and each exchange is
+    declared once per connection.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._connections: dict = {}  # type: ignore[type-arg]
+
+    @staticmethod
+    def _key(parameters):
+        return tuple((p.host, p.port, p.virtual_host) for p in parameters)
+
+    def get(self, parameters) -> PooledConnection:
+        key = self._key(parameters)
+        with self._lock:
+            pooled = self._connections.get(key)
+            if pooled is None or not pooled.is_open:
+                # connect under the lock so that racing threads open one connection
+                pooled = PooledConnection(parameters)
+                self._connections[key] = pooled
+        return pooled
+
+    def discard(self, pooled: PooledConnection):
+        with self._lock:
+            for key, entry in list(self._connections.items()):
+                if entry is pooled:
+                    del self._connections[key]
+        pooled.close()
+
+    def close(self):
+        with self._lock:
+            pooled_connections = list(self._connections.values())
+        for pooled in pooled_connections:
+            self.discard(pooled)
+
+
+connection_pool = ConnectionPool()
 
 
 class MQConnection(AppThread):
@@ -37,6 +583,9 @@ class MQConnection(AppThread):
         mq_topic_filter="#",
         mq_exchange_type="topic",
         mq_arguments=None,
+        mq_publisher_confirms=False,
+        mq_confirm_window=CONFIRM_WINDOW,
+        mq_connection_pool=None,
     ):
         AppThread.__init__(self, name=name)
 
@@ -64,6 +613,28 @@ class MQConnection(AppThread):
         self._mq_connection = None
         self._mq_channel = None
         self._mq_queue_name = None
+        # an exclusive queue lives as long as the connection that declared it
+        self._mq_queue_connection = None
+
+        if mq_connection_pool is None:
+            mq_connection_pool = mq_pooling
+        self._mq_pooled = None
+        # the confirm pipeline processes its connection's events itself, so it is not pooled
+        self._mq_pool = (
+            connection_pool if mq_connection_pool and not mq_publisher_confirms else None
+        )
+
+        self._mq_publisher = None
+        if mq_publisher_confirms:
+            self._mq_publisher = ConfirmedPublisher(window=mq_confirm_window)
+
+    def _publish_fields(self, routing_key, message_body):
+        return {
+            "message_bytes": len(message_body),
+            "exchange_name": self._mq_exchange_name,
+            "routing_key": routing_key,
+            "queue_name": self._mq_queue_name,
+        }
 
     def _basic_publish(
         self, routing_key, event_payload, close_channel=False, close_connection=False
@@ -79,20 +650,32 @@ class MQConnection(AppThread):
                 ) from e
             try:
                 message_body = make_payload(data=event_payload)
-                log.debug(
+                log_debug(
                     "Sending message to exchange",
-                    extra={
-                        "message_bytes": len(message_body),
-                        "exchange_name": self._mq_exchange_name,
-                        "routing_key": routing_key,
-                        "queue_name": self._mq_queue_name,
-                    },
-                )
-                self._mq_channel.basic_publish(  # type: ignore
-                    exchange=self._mq_exchange_name,
-                    routing_key=routing_key,
-                    body=message_body,  # type: ignore
+                    partial(self._publish_fields, routing_key, message_body),
                 )
+                if self._mq_publisher is not None:
+                    self._mq_publisher.publish(
+                        exchange=self._mq_exchange_name,
+                        routing_key=routing_key,
+                        body=message_body,
+                    )
+                    if close_channel:
+                        # confirms for this channel are lost once it closes
+                        self._mq_publisher.flush()
+                elif self._mq_pooled is not None:
+                    self._mq_pooled.call(
+                        self._mq_channel.basic_publish,  # type: ignore
+                        exchange=self._mq_exchange_name,
+                        routing_key=routing_key,
+                        body=message_body,
+                    )
+                else:
+                    self._mq_channel.basic_publish(  # type: ignore
+                        exchange=self._mq_exchange_name,
+                        routing_key=routing_key,
+                        body=message_body,  # type: ignore
+                    )
                 success = True
                 # exit loop
                 break
@@ -109,7 +692,7 @@ class MQConnection(AppThread):
                     log.debug(
                         "Closing potentially stale channel", extra={"successful_attempt": success}
                     )
-                    self._close_channel()
+                    self._close_channel(discard=not success)
                     if tries > 1 and (close_connection or not success):
                         log.debug(
                             "Closing potentially stale connection",
@@ -124,21 +707,43 @@ class MQConnection(AppThread):
         if self._mq_connection is None or self._mq_connection.is_closed:
             if self._mq_connection:
                 log.debug("Recreating RabbitMQ connection...")
-            self._mq_connection = pika.BlockingConnection(parameters=self._pika_parameters)
+            if self._mq_pool is not None:
+                self._mq_pooled = self._mq_pool.get(self._pika_parameters)
+                self._mq_connection = self._mq_pooled.connection
+            else:
+                self._mq_connection = pika.BlockingConnection(parameters=self._pika_parameters)
 
     def _setup_channel(self):
         self._setup_connection()
         if self._mq_channel is None or self._mq_channel.is_closed:
             if self._mq_channel:
                 log.debug("Recreating RabbitMQ channel...")
-            self._mq_channel = self._mq_connection.channel()  # type: ignore
-            self._mq_channel.exchange_declare(
-                exchange=self._mq_exchange_name,
-                exchange_type=self._mq_exchange_type,
-                arguments=self._mq_arguments,
-            )
-            mq_result = self._mq_channel.queue_declare("", exclusive=True)
-            self._mq_queue_name = mq_result.method.queue
+            if self._mq_pooled is not None:
+                self._mq_channel = self._mq_pooled.lease_channel()
+                self._mq_pooled.declare_exchange(
+                    channel=self._mq_channel,
+                    exchange=self._mq_exchange_name,
+                    exchange_type=self._mq_exchange_type,
+                    arguments=self._mq_arguments,
+                )
+            else:
+                self._mq_channel = self._mq_connection.channel()  # type: ignore
+                self._mq_channel.exchange_declare(
+                    exchange=self._mq_exchange_name,
+                    exchange_type=self._mq_exchange_type,
+                    arguments=self._mq_arguments,
+                )
+            if self._mq_queue_connection is not self._mq_connection:
+                if self._mq_pooled is not None:
+                    mq_result = self._mq_pooled.call(
+                        self._mq_channel.queue_declare,  # type: ignore
+                        "",
+                        exclusive=True,
+                    )
+                else:
+                    mq_result = self._mq_channel.queue_declare("", exclusive=True)  # type: ignore
+                self._mq_queue_name = mq_result.method.queue
+                self._mq_queue_connection = self._mq_connection
             log.debug(
                 "Using RabbitMQ server(s)",
                 extra={
@@ -148,8 +753,24 @@ class MQConnection(AppThread):
                     "queue_name": self._mq_queue_name,
                 },
             )
+            if self._mq_publisher is not None:
+                self._mq_publisher.attach(connection=self._mq_connection, channel=self._mq_channel)
+
+    def flush_confirms(self, timeout: float = CONFIRM_TIMEOUT) -> int:
+        """Wait for outstanding publisher confirms, returning how many remain unconfirmed."""
+        if self._mq_publisher is None:
+            return 0
+        self._setup_channel()
+        return self._mq_publisher.flush(timeout=timeout)
 
     def _close_connection(self):
+        if self._mq_pooled is not None:
+            # other instances may still be using a healthy pooled connection
+            if self._mq_pooled.leases == 0 or not self._mq_pooled.is_open:
+                self._mq_pool.discard(self._mq_pooled)  # type: ignore
+            self._mq_pooled = None
+            self._mq_connection = None
+            return
         if self._mq_connection and self._mq_connection.is_open:
             log.debug("Closing RabbitMQ connection...")
             try:
@@ -157,7 +778,14 @@ class MQConnection(AppThread):
             except Exception:
                 log.debug(self.__class__.__name__, exc_info=True)
 
-    def _close_channel(self):
+    def _close_channel(self, discard=False):
+        if self._mq_pooled is not None and self._mq_channel is not None:
+            try:
+                self._mq_pooled.release_channel(self._mq_channel, reuse=not discard)
+            except AMQPError:
+                log.debug(self.__class__.__name__, exc_info=True)
+            self._mq_channel = None
+            return
         if self._mq_channel and self._mq_channel.is_open:
             log.debug("Closing RabbitMQ channel...")
             try:
@@ -166,10 +794,147 @@ class MQConnection(AppThread):
                 log.debug(self.__class__.__name__, exc_info=True)
 
     def stop(self):
+        if self._mq_publisher is not None and self._mq_publisher.pending > 0:
+            try:
+                unconfirmed = self._mq_publisher.flush()
+            except Exception:
+                log.debug(self.__class__.__name__, exc_info=True)
+                unconfirmed = self._mq_publisher.pending
+            if unconfirmed > 0:
+                log.warning(
+                    "Stopping with unconfirmed messages", extra={"unconfirmed": unconfirmed}
+                )
         self._close_channel()
         self._close_connection()
 
 
+def compile_topic_pattern(pattern):
+    """Compile an AMQP topic pattern, where * is one word and # is zero or more words."""
+    words: list[str] = []
+    for word in pattern.split("."):
+        # consecutive # words match no more than one does
+        if word != "#" or not words or words[-1] != "#":
+            words.append(word)
+    if words == ["#"]:
+        return re.compile(r".*")
+    regex = ""
+    for i, word in enumerate(words):
+        if word == "#":
+            # carry the separator on the side that has a neighbouring word
+            regex += r"(?:[^.]+\.)*" if i == 0 else r"(?:\.[^.]+)*"
+            continue
+        if i > 0 and not (i == 1 and words[0] == "#"):
+            regex += r"\."
+        regex += r"[^.]+" if word == "*" else re.escape(word)
+    return re.compile(regex)
+
+
+class TopicRouter:
+    """Routing table from AMQP topic patterns to targets.
+
+    Patterns are compiled once when added and the targets matched by each
+    routing key are cached, so a repeated topic costs one dictionary lookup.
+    Routes are matched in the order they were added; every matching target is
+    returned.
+    """
+
+    def __init__(self, routes=None, cache_size: int = TOPIC_CACHE_SIZE):
+        self._routes: list = []  # type: ignore[type-arg]
+        self._cache: dict = {}  # type: ignore[type-arg]
+        self._cache_size = cache_size
+        if isinstance(routes, dict):
+            routes = routes.items()
+        for pattern, target in routes or ():
+            self.add(pattern, target)
+
+    def __len__(self):
+        return len(self._routes)
+
+    @property
+    def targets(self):
+        return [target for _, _, target in self._routes]
+
+    def add(self, pattern, target):
+        self._routes.append((pattern, compile_topic_pattern(pattern), target))
+        self._cache.clear()
+
+    def match(self, routing_key) -> tuple:  # type: ignore[type-arg]
+        try:
+            return self._cache[routing_key]
+        except KeyError:
+            pass
+        targets = tuple(target for _, regex, target in self._routes if regex.fullmatch(routing_key))
+        if len(self._cache) >= self._cache_size:
+            self._cache.clear()
+        self._cache[routing_key] = targets
+        return targets
+
+
+class Coalescer:
+    """Latest value per key, forwarded at most once per interval for each key.
+
+    The first value for a key is forwarded straight away. Values arriving
+    within the interval that follows replace one another and only the latest
+    is forwarded by flush once the interval has passed; those it replaced are
+    counted as suppressed, as are values equal to the last one forwarded for
+    their key.
+
+    Delivery is at most once: a ZMQListener acknowledges a coalesced message
+    when it is offered, so a held value is lost if the listener stops before
+    the flush that would have forwarded it.
+    """
+
+    def __init__(self, interval_ms, forward):
+        self._interval_secs = interval_ms / 1000
+        self._forward = forward
+        self._forwarded_at: dict = {}  # type: ignore[type-arg]
+        self._forwarded_value: dict = {}  # type: ignore[type-arg]
+        self._pending: dict = {}  # type: ignore[type-arg]
+        self.forwarded = 0
+        self.suppressed = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    @property
+    def interval_secs(self):
+        return self._interval_secs
+
+    def _send(self, key, value, now):
+        self._forwarded_at[key] = now
+        self._forwarded_value[key] = value
+        self.forwarded += 1
+        self._forward(key, value)
+
+    def offer(self, key, value):
+        """Forward or hold value, returning whether it is held for a later flush."""
+        now = time.monotonic()
+        forwarded_at = self._forwarded_at.get(key)
+        if forwarded_at is not None and value == self._forwarded_value[key]:
+            # the latest value is already forwarded, so any held one is stale too
+            self.suppressed += 1 + (self._pending.pop(key, None) is not None)
+            return False
+        if key in self._pending:
+            self.suppressed += 1
+        elif forwarded_at is None or now - forwarded_at >= self._interval_secs:
+            self._send(key, value, now)
+            return False
+        self._pending[key] = value
+        return True
+
+    def flush(self):
+        """Forward the held values that are due, returning seconds until the next one is."""
+        now = time.monotonic()
+        next_due = None
+        for key in list(self._pending):
+            due = self._forwarded_at[key] + self._interval_secs - now
+            if due <= 0:
+                self._send(key, self._pending.pop(key), now)
+            elif next_due is None or due < next_due:
+                next_due = due
+        return next_due
+
+
 class ZMQListener(MQConnection):
     def __init__(
         self,
@@ -178,6 +943,15 @@ class ZMQListener(MQConnection):
         mq_exchange_name,
         mq_topic_filter,
         mq_exchange_type,
+        zmq_codec=None,
+        engine=None,
+        mq_prefetch_count=0,
+        mq_ack_every=None,
+        mq_ack_interval_ms=ACK_INTERVAL_MS,
+        mq_routes=None,
+        forward_raw=False,
+        check_header=False,
+        coalesce_interval_ms=None,
     ):
         MQConnection.__init__(
             self,
@@ -186,8 +960,64 @@ class ZMQListener(MQConnection):
             mq_exchange_name=mq_exchange_name,
             mq_topic_filter=mq_topic_filter,
             mq_exchange_type=mq_exchange_type,
+            # consuming drives the connection from this thread
+            mq_connection_pool=False,
         )
         self._zmq_url = zmq_url
+        self._zmq_codec = zmq_codec
+        self._engine = _check_engine(engine)
+        self._select_engine = None
+
+        # with a prefetch, deliveries are acknowledged in batches once forwarded to ZMQ
+        self._mq_prefetch_count = mq_prefetch_count
+        if mq_ack_every is None:
+            mq_ack_every = max(1, mq_prefetch_count // 2)
+        self._mq_ack_every = mq_ack_every
+        self._mq_ack_interval_secs = mq_ack_interval_ms / 1000
+        self._ack_channel = None
+        self._ack_tag = None
+        self._unacked = 0
+        self.acked = 0
+
+        # topic pattern -> handler(topic, event), ZMQ sink URL or None to discard
+        self._router = None
+        if mq_routes is not None:
+            self._router = (
+                mq_routes if isinstance(mq_routes, TopicRouter) else TopicRouter(mq_routes)
+            )
+        self._sinks: dict = {}  # type: ignore[type-arg]
+        # routing key -> (device key or raw topic frame, is device event, sockets, handlers),
+        # or None if not routable
+        self._topic_cache: dict = {}  # type: ignore[type-arg]
+
+        # forward [topic, body] frames as received, leaving decoding to the consumer
+        self._forward_raw = forward_raw
+        self._check_header = check_header
+
+        # heartbeat and leader messages forwarded as the latest value per topic
+        self.coalescer = None
+        if coalesce_interval_ms is not None:
+            self.coalescer = Coalescer(
+                interval_ms=coalesce_interval_ms, forward=self._deliver_coalesced
+            )
+        self._coalesce_scheduled = False
+
+    def _basic_publish(
+        self, routing_key, event_payload, close_channel=False, close_connection=False
+    ):
+        if self._select_engine is None:
+            MQConnection._basic_publish(
+                self,
+                routing_key=routing_key,
+                event_payload=event_payload,
+                close_channel=close_channel,
+                close_connection=close_connection,
+            )
+            return
+        # hand the message to the I/O loop rather than opening a blocking connection
+        self._select_engine.publish_threadsafe(
+            routing_key=routing_key, body=make_payload(data=event_payload)
+        )
 
     def _setup_channel(self):
         MQConnection._setup_channel(self)
@@ -196,16 +1026,55 @@ class ZMQListener(MQConnection):
             queue=self._mq_queue_name,
             routing_key=self._mq_topic_filter,
         )
+        if self._mq_prefetch_count:
+            self._mq_channel.basic_qos(prefetch_count=self._mq_prefetch_count)  # type: ignore
         self._mq_channel.basic_consume(  # type: ignore
-            queue=self._mq_queue_name, on_message_callback=self.callback, auto_ack=True
+            queue=self._mq_queue_name,
+            on_message_callback=self.callback,
+            auto_ack=not self._mq_prefetch_count,
         )
 
     # noinspection PyBroadException
     def run(self):
-        with exception_handler(
-            connect_url=self._zmq_url, and_raise=False, shutdown_on_error=True
-        ) as zmq_socket:
+        with (
+            exception_handler(
+                connect_url=self._zmq_url,
+                and_raise=False,
+                shutdown_on_error=True,
+                codec=self._zmq_codec,
+            ) as zmq_socket,
+            ExitStack() as stack,
+        ):
             self.processor = zmq_socket
+            if self._router is not None:
+                for target in self._router.targets:
+                    if isinstance(target, str) and target not in self._sinks:
+                        self._sinks[target] = stack.enter_context(
+                            exception_handler(
+                                connect_url=target,
+                                and_raise=False,
+                                shutdown_on_error=True,
+                                codec=self._zmq_codec,
+                            )
+                        )
+            if self._engine == ENGINE_SELECT:
+                self._select_engine = SelectEngine(
+                    parameters=self._pika_parameters,
+                    exchange_name=self._mq_exchange_name,
+                    exchange_type=self._mq_exchange_type,
+                    exchange_arguments=self._mq_arguments,
+                )
+                self._select_engine.consume(
+                    topic_filter=self._mq_topic_filter,
+                    on_message_callback=self.callback,
+                    prefetch_count=self._mq_prefetch_count,
+                )
+                log.debug("Ready for RabbitMQ messages.")
+                try:
+                    self._select_engine.run()
+                finally:
+                    log.debug("RabbitMQ listener has finished.")
+                return
             try:
                 self._setup_channel()
                 log.debug("Ready for RabbitMQ messages.")
@@ -221,29 +1090,129 @@ class ZMQListener(MQConnection):
                 log.debug("RabbitMQ listener has finished.")
 
     def callback(self, ch, method, properties, body):
-        topic = method.routing_key
-        log.debug("Message received", extra={"topic": topic, "message_bytes": len(body)})
+        handled = self._forward(topic=method.routing_key, body=body)
+        if handled and self._mq_prefetch_count:
+            self._ack(channel=ch, delivery_tag=method.delivery_tag)
+
+    def _route(self, topic):
+        try:
+            return self._topic_cache[topic]
+        except KeyError:
+            pass
+        route = None
         topic_parts = topic.split(".")
-        if len(topic_parts) < 3:
-            log.debug(
+        if len(topic_parts) >= 3:
+            sockets = []
+            handlers = []
+            # unmatched topics go to the processor socket as before
+            targets = self._router.match(topic) if self._router is not None else ()
+            for target in targets or (self.processor,):
+                if isinstance(target, str):
+                    sockets.append(self._sinks[target])
+                elif target is self.processor:
+                    sockets.append(target)
+                elif target is not None:
+                    handlers.append(target)
+            is_device_event = topic_parts[1] not in ["heartbeat", "leader"]
+            device_key = topic.encode() if self._forward_raw else topic_parts[2]
+            route = (device_key, is_device_event, tuple(sockets), tuple(handlers))
+        if len(self._topic_cache) >= TOPIC_CACHE_SIZE:
+            self._topic_cache.clear()
+        self._topic_cache[topic] = route
+        return route
+
+    def _forward(self, topic, body):
+        log_debug("Message received", lambda: {"topic": topic, "message_bytes": len(body)})
+        route = self._route(topic)
+        if route is None:
+            log_debug(
                 "Ignoring non-routable message due to unsufficient topic parts",
-                extra={"topic": topic},
+                lambda: {"topic": topic},
             )
-            return
-        if topic_parts[1] not in ["heartbeat", "leader"]:
-            log.debug("Device event on topic", extra={"topic": topic})
-        device_event = None
-        try:
-            device_event = msgpack.unpackb(body)
-        except UnpackException:
-            log.exception("Bad message", extra={"body": body})
-            return
+            return True
+        is_device_event = route[1]
+        if is_device_event:
+            log_debug("Device event on topic", lambda: {"topic": topic})
+        if self._forward_raw:
+            if self._check_header and not is_packed_map(body):
+                log.warning("Bad message", extra={"topic": topic, "message_bytes": len(body)})
+                return True
+            payload = body
+        else:
+            try:
+                payload = unpack_payload(body)
+            except BAD_PAYLOAD_ERRORS:
+                log.exception("Bad message", extra={"body": body})
+                return True
+        if self.coalescer is not None and not is_device_event:
+            if self.coalescer.offer(topic, (route, payload)) and not self._coalesce_scheduled:
+                self._coalesce_scheduled = True
+                self._call_later(self.coalescer.interval_secs, self._flush_coalesced)
+            return True
+        return self._deliver(topic, route, payload)
+
+    def _deliver(self, topic, route, payload):
+        device_key, _, sockets, handlers = route
         try:
-            self.processor.send_pyobj({topic_parts[2]: device_event})
+            if self._forward_raw:
+                for socket in sockets:
+                    socket.send_multipart([device_key, payload], copy=False)
+                for handler in handlers:
+                    handler(topic, LazyPayload(payload))
+            else:
+                for socket in sockets:
+                    send_obj(socket, {device_key: payload})
+                for handler in handlers:
+                    handler(topic, payload)
         except Exception as e:
             log.debug(self.__class__.__name__, exc_info=True)
             if not threads.shutting_down:
                 raise e
+            # leave the delivery unacknowledged for the broker to redeliver
+            return False
+        return True
+
+    def _deliver_coalesced(self, topic, value):
+        route, payload = value
+        self._deliver(topic, route, payload)
+
+    def _flush_coalesced(self):
+        next_due = self.coalescer.flush()  # type: ignore
+        self._coalesce_scheduled = next_due is not None
+        if next_due is not None:
+            self._call_later(next_due, self._flush_coalesced)
+
+    def _call_later(self, delay, callback):
+        # timers run on the thread consuming, between deliveries
+        timers = self._select_engine or self._mq_connection
+        timers.call_later(delay, callback)  # type: ignore
+
+    def _ack(self, channel, delivery_tag):
+        if channel is not self._ack_channel:
+            # delivery tags are per channel; anything unacknowledged on the old one is requeued
+            self._ack_channel = channel
+            self._unacked = 0
+        self._ack_tag = delivery_tag
+        self._unacked += 1
+        if self._unacked >= self._mq_ack_every:
+            self.flush_acks()
+        elif self._unacked == 1:
+            # acknowledge stragglers when a burst ends before the batch fills
+            self._call_later(self._mq_ack_interval_secs, self.flush_acks)
+
+    def flush_acks(self):
+        """Acknowledge every delivery forwarded so far with one multiple-ack."""
+        if self._unacked == 0:
+            return
+        if self._ack_channel.is_open:  # type: ignore
+            self._ack_channel.basic_ack(delivery_tag=self._ack_tag, multiple=True)  # type: ignore
+            self.acked += self._unacked
+        self._unacked = 0
+
+    def stop(self):
+        if self._select_engine is not None:
+            self._select_engine.stop()
+        MQConnection.stop(self)
 
 
 class RabbitMQRelay(AppThread):
@@ -254,43 +1223,258 @@ class RabbitMQRelay(AppThread):
         mq_exchange_name,
         mq_topic_filter,
         mq_exchange_type,
+        zmq_codec=None,
+        mq_batch_size=1,
+        mq_batch_linger_ms=5,
+        engine=None,
+        mq_connection_pool=None,
+        spool_path=None,
+        spool_size=SPOOL_SIZE,
+        spool_drain_rate=SPOOL_DRAIN_RATE,
     ):
         AppThread.__init__(self, name=f"{self.__class__.__name__} ({zmq_url})")
         self._source_zmq_url = zmq_url
         self._source_socket_type = zmq.PULL
+        self._source_codec = zmq_codec
+
+        self._mq_batch_size = mq_batch_size
+        self._mq_batch_linger_secs = mq_batch_linger_ms / 1000
+        self.batches_published = 0
+        self.messages_published = 0
+        self.last_batch_size = 0
+        self.last_batch_latency_ms = 0.0
 
         self._mq_config_server = mq_server_address
-        self._mq_connection = pika.BlockingConnection(
-            pika.ConnectionParameters(
-                host=self._mq_config_server,
-                blocked_connection_timeout=BLOCKED_CONNECTION_TIMEOUT,
-            )
-        )
-        self._mq_channel = self._mq_connection.channel()
         self._mq_config_exchange = mq_exchange_name
         self._mq_exchange_type = mq_exchange_type
-        self._mq_channel.exchange_declare(
-            exchange=self._mq_config_exchange, exchange_type=self._mq_exchange_type
-        )
         self._mq_device_topic = mq_topic_filter
+        self._engine = _check_engine(engine)
+        self._select_engine = None
+        self._mq_connection = None
+        self._mq_channel = None
+
+        # while the broker is unavailable messages are spooled to disk; once it is back, live
+        # messages are published directly and the backlog is replayed in order on top of them
+        # at up to spool_drain_rate messages per second
+        self._spool = None
+        if spool_path is not None:
+            if self._engine != ENGINE_BLOCKING:
+                raise AssertionError("Spooling requires the blocking engine.")
+            self._spool = Spool(path=spool_path, size=spool_size)
+        self._spool_drain_rate = spool_drain_rate
+        self._drain_allowance = 0.0
+        self._drain_checked = time.monotonic()
+        self._retry_at = 0.0
+
+        if mq_connection_pool is None:
+            mq_connection_pool = mq_pooling
+        self._mq_pooled = None
+        self._mq_pool = connection_pool if mq_connection_pool else None
+        pika_parameters = pika.ConnectionParameters(
+            host=self._mq_config_server,
+            blocked_connection_timeout=BLOCKED_CONNECTION_TIMEOUT,
+        )
+        if self._engine == ENGINE_SELECT:
+            # publishes are buffered on the loop, so each drain of the socket is a batch
+            if mq_batch_size > 1:
+                log.warning(
+                    "Ignoring mq_batch_size with the select engine",
+                    extra={"mq_batch_size": mq_batch_size, "engine": self._engine},
+                )
+            self._select_engine = SelectEngine(
+                parameters=(pika_parameters,),
+                exchange_name=self._mq_config_exchange,
+                exchange_type=self._mq_exchange_type,
+            )
+            return
+        self._pika_parameters = (pika_parameters,)
+        if self._spool is None:
+            self._connect()
+        else:
+            self._reconnect()
 
     @property
     def device_topic(self):
         return self._mq_device_topic
 
-    def close(self):
-        self._mq_connection.close()
+    @property
+    def spool_depth(self):
+        return 0 if self._spool is None else self._spool.depth
 
-    def process_message(self, zmq_socket):
-        event_topic, event_payload = zmq_socket.recv_pyobj()
+    @property
+    def spool_age(self):
+        return 0.0 if self._spool is None else self._spool.age
+
+    def _connect(self):
+        if self._mq_pool is not None:
+            self._setup_channel()
+            return
+        self._mq_connection = pika.BlockingConnection(self._pika_parameters[0])
+        self._mq_channel = self._mq_connection.channel()
+        self._mq_channel.exchange_declare(
+            exchange=self._mq_config_exchange, exchange_type=self._mq_exchange_type
+        )
+
+    def _reconnect(self):
+        if self._mq_connection is not None and self._mq_connection.is_open:
+            return True
+        if time.monotonic() < self._retry_at:
+            return False
         try:
-            self._mq_channel.basic_publish(
-                exchange=self._mq_config_exchange,
-                routing_key=event_topic,
-                body=make_payload(data=event_payload),  # type: ignore
+            self._connect()
+        except AMQPConnectionError as e:
+            log.debug("RabbitMQ still unavailable", extra={"error": repr(e)})
+            self._retry_at = time.monotonic() + SPOOL_RETRY_SECS
+            return False
+        log.info(
+            "RabbitMQ connection available",
+            extra={"spool_depth": self.spool_depth, "spool_age": self.spool_age},
+        )
+        return True
+
+    def _disconnect(self, error):
+        log.warning(
+            "RabbitMQ unavailable, spooling messages",
+            extra={"error": repr(error), "spool_depth": self.spool_depth},
+        )
+        if self._mq_pooled is not None:
+            self._mq_pool.discard(self._mq_pooled)  # type: ignore
+            self._mq_pooled = None
+        elif self._mq_connection is not None and self._mq_connection.is_open:
+            try:
+                self._mq_connection.close()
+            except Exception:
+                log.debug(self.__class__.__name__, exc_info=True)
+        self._mq_connection = None
+        self._mq_channel = None
+        self._retry_at = time.monotonic() + SPOOL_RETRY_SECS
+
+    def _setup_channel(self):
+        self._mq_pooled = self._mq_pool.get(self._pika_parameters)  # type: ignore
+        self._mq_connection = self._mq_pooled.connection
+        self._mq_channel = self._mq_pooled.lease_channel()
+        self._mq_pooled.declare_exchange(
+            channel=self._mq_channel,
+            exchange=self._mq_config_exchange,
+            exchange_type=self._mq_exchange_type,
+        )
+
+    def close(self):
+        if self._select_engine is not None:
+            self._select_engine.stop()
+            return
+        if self._mq_pooled is not None:
+            try:
+                self._mq_pooled.release_channel(self._mq_channel)
+            except AMQPError:
+                log.debug(self.__class__.__name__, exc_info=True)
+            if self._mq_pooled.leases == 0 or not self._mq_pooled.is_open:
+                self._mq_pool.discard(self._mq_pooled)  # type: ignore
+            self._mq_pooled = None
+        elif self._mq_connection is not None and self._mq_connection.is_open:
+            self._mq_connection.close()
+        if self._spool is not None:
+            self._spool.close()
+
+    def _relay_message(self, zmq_socket):
+        event_topic, event_payload = recv_obj(zmq_socket, flags=zmq.NOBLOCK)
+        self._select_engine.publish(  # type: ignore
+            routing_key=event_topic, body=make_payload(data=event_payload)
+        )
+        self.messages_published += 1
+
+    def _publish(self, messages):
+        if self._mq_pooled is not None:
+            # buffered on the shared connection and sent by its I/O thread
+            self._mq_pooled.call(self._buffer_publishes, messages)
+        elif len(messages) == 1:
+            routing_key, body = messages[0]
+            self._mq_channel.basic_publish(  # type: ignore
+                exchange=self._mq_config_exchange, routing_key=routing_key, body=body
+            )
+        else:
+            self._buffer_publishes(messages)
+            self._mq_connection.process_data_events(time_limit=0)  # type: ignore
+        self.messages_published += len(messages)
+
+    def _buffer_publishes(self, messages):
+        # the underlying channel buffers each publish so that one flush sends the burst
+        channel = self._mq_channel._impl  # type: ignore
+        for routing_key, body in messages:
+            channel.basic_publish(
+                exchange=self._mq_config_exchange, routing_key=routing_key, body=body
             )
-        except (ConnectionClosedByBroker, StreamLostError) as e:
-            raise ResourceWarning() from e
+
+    def _send(self, messages):
+        if self._spool is None:
+            try:
+                self._publish(messages)
+            except (ConnectionClosedByBroker, StreamLostError) as e:
+                raise ResourceWarning() from e
+            return
+        if self._reconnect():
+            try:
+                self._publish(messages)
+                return
+            except PUBLISH_ERRORS as e:
+                self._disconnect(e)
+        for routing_key, body in messages:
+            self._spool.append(routing_key=routing_key, body=body)
+
+    def drain_spool(self):
+        """Publish spooled messages within the drain rate, returning how many remain."""
+        if self._spool is None:
+            return 0
+        now = time.monotonic()
+        self._drain_allowance = min(
+            float(self._spool_drain_rate),
+            self._drain_allowance + (now - self._drain_checked) * self._spool_drain_rate,
+        )
+        self._drain_checked = now
+        if len(self._spool) == 0 or self._drain_allowance < 1 or not self._reconnect():
+            return len(self._spool)
+        records = self._spool.peek(count=int(self._drain_allowance))
+        try:
+            self._publish([(routing_key, body) for routing_key, body, _ in records])
+        except PUBLISH_ERRORS as e:
+            # the records stay spooled for the next attempt
+            self._disconnect(e)
+            return len(self._spool)
+        self._spool.pop(count=len(records))
+        self._drain_allowance -= len(records)
+        if len(self._spool) == 0:
+            log.info("Spool drained", extra={"spool_path": self._spool.path})
+        return len(self._spool)
+
+    def process_batch(self, zmq_socket):
+        batch = recv_batch(
+            zmq_socket, max_messages=self._mq_batch_size, linger_secs=self._mq_batch_linger_secs
+        )
+        started = time.monotonic()
+        self._send(
+            [
+                (event_topic, make_payload(data=event_payload))
+                for event_topic, event_payload in batch
+            ]
+        )
+        self.batches_published += 1
+        self.last_batch_size = len(batch)
+        self.last_batch_latency_ms = (time.monotonic() - started) * 1000
+        log_debug(
+            "Published message batch",
+            lambda: {
+                "batch_size": self.last_batch_size,
+                "batch_latency_ms": self.last_batch_latency_ms,
+                "exchange_name": self._mq_config_exchange,
+            },
+        )
+
+    def process_message(self, zmq_socket):
+        if self._mq_batch_size > 1:
+            self.process_batch(zmq_socket=zmq_socket)
+            return
+        event_topic, event_payload = recv_obj(zmq_socket)
+        self._send([(event_topic, make_payload(data=event_payload))])
 
     def startup(self):
         log.debug(
@@ -299,6 +1483,7 @@ class RabbitMQRelay(AppThread):
                 "server_address": self._mq_config_server,
                 "exchange_type": self._mq_exchange_type,
                 "device_topic": self._mq_device_topic,
+                "engine": self._engine,
                 "exchange_name": self._mq_config_exchange,
             },
         )
@@ -310,6 +1495,16 @@ class RabbitMQRelay(AppThread):
             socket_type=self._source_socket_type,
             and_raise=False,
             shutdown_on_error=True,
+            codec=self._source_codec,
         ) as zmq_socket:
+            if self._select_engine is not None:
+                self._select_engine.add_zmq_source(socket=zmq_socket, handler=self._relay_message)
+                self._select_engine.run()
+                return
             while not threads.shutting_down:
+                if self._spool is not None:
+                    self.drain_spool()
+                    # wake up to drain the spool even when no new messages arrive
+                    if not zmq_socket.poll(timeout=SPOOL_POLL_MS):
+                        continue
                 self.process_message(zmq_socket=zmq_socket)
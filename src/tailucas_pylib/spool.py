@@ -0,0 +1,135 @@
+import mmap
+import os
+import struct
+import time
+
+from . import log
+
+SPOOL_MAGIC = b"TLSP"
+SPOOL_SIZE = 16 * 1024 * 1024
+
+# magic, read offset, write offset, record count
+_HEADER = struct.Struct("<4sQQQ")
+# record length, timestamp, routing key length
+_RECORD = struct.Struct("<IdH")
+
+
+class Spool:
+    """Append-only spool of outbound messages in a memory-mapped file.
+
+    Records are appended at the write offset and consumed from the read
+    offset. Both offsets live in the file header, so a restarted process
+    carries on from where the last one stopped. The space of consumed records
+    is reclaimed when the spool empties, or by moving the unread records to the
+    front when an append would not otherwise fit. Appends to a full spool are
+    dropped and counted. Writes reach the page cache only; they survive a
+    process crash but not a host crash.
+    """
+
+    def __init__(self, path: str, size: int = SPOOL_SIZE):
+        self.path = path
+        self.dropped = 0
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            size = max(size, os.fstat(fd).st_size)
+            os.ftruncate(fd, size)
+            self._mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self._size = size
+        magic, self._read, self._write, self._depth = _HEADER.unpack_from(self._mmap, 0)
+        if magic != SPOOL_MAGIC:
+            if magic.strip(b"\x00"):
+                log.warning("Resetting unrecognised spool file", extra={"spool_path": path})
+            self._read = self._write = _HEADER.size
+            self._depth = 0
+            self._store_header()
+        elif self._depth > 0:
+            log.info(
+                "Resuming spool",
+                extra={"spool_path": path, "spool_depth": self._depth, "spool_age": self.age},
+            )
+
+    def __len__(self):
+        return self._depth
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    @property
+    def age(self) -> float:
+        """Seconds since the oldest unread record was appended."""
+        if self._depth == 0:
+            return 0.0
+        _, timestamp, _ = _RECORD.unpack_from(self._mmap, self._read)
+        return time.time() - timestamp
+
+    def _store_header(self):
+        _HEADER.pack_into(self._mmap, 0, SPOOL_MAGIC, self._read, self._write, self._depth)
+
+    def _compact(self):
+        unread = self._write - self._read
+        self._mmap.move(_HEADER.size, self._read, unread)
+        self._read = _HEADER.size
+        self._write = _HEADER.size + unread
+        self._store_header()
+
+    def append(self, routing_key: str, body: bytes, timestamp: float | None = None) -> bool:
+        key = routing_key.encode()
+        length = _RECORD.size + len(key) + len(body)
+        if self._write + length > self._size and self._read > _HEADER.size:
+            self._compact()
+        if self._write + length > self._size:
+            self.dropped += 1
+            log.warning(
+                "Spool full, dropping message",
+                extra={
+                    "spool_path": self.path,
+                    "routing_key": routing_key,
+                    "dropped": self.dropped,
+                },
+            )
+            return False
+        if timestamp is None:
+            timestamp = time.time()
+        offset = self._write
+        _RECORD.pack_into(self._mmap, offset, length, timestamp, len(key))
+        offset += _RECORD.size
+        self._mmap[offset : offset + len(key)] = key
+        offset += len(key)
+        self._mmap[offset : offset + len(body)] = body
+        self._write += length
+        self._depth += 1
+        self._store_header()
+        return True
+
+    def peek(self, count: int = 1) -> list[tuple[str, bytes, float]]:
+        """Return up to count of the oldest records as (routing key, body, timestamp)."""
+        records = []
+        offset = self._read
+        for _ in range(min(count, self._depth)):
+            length, timestamp, key_length = _RECORD.unpack_from(self._mmap, offset)
+            body_offset = offset + _RECORD.size + key_length
+            routing_key = self._mmap[offset + _RECORD.size : body_offset].decode()
+            records.append((routing_key, self._mmap[body_offset : offset + length], timestamp))
+            offset += length
+        return records
+
+    def pop(self, count: int = 1):
+        for _ in range(min(count, self._depth)):
+            (length,) = struct.unpack_from("<I", self._mmap, self._read)
+            self._read += length
+            self._depth -= 1
+        if self._depth == 0:
+            self._read = self._write = _HEADER.size
+        self._store_header()
+
+    def flush(self):
+        self._mmap.flush()
+
+    def close(self):
+        if self._mmap.closed:
+            return
+        self.flush()
+        self._mmap.close()
@@ -1,4 +1,5 @@
 import logging
+import multiprocessing
 import signal
 import sys
 import threading
@@ -124,6 +125,9 @@ def thread_nanny(signal_handler):
                             "Lingering thread stack frame",
                             extra={"thread_name": thread_info.getName(), "stack_line": line},
                         )
+        # child processes are tracked by name alongside threads
+        for process_info in multiprocessing.active_children():
+            threads_alive.add(process_info.name)
         if not shutting_down:
             thread_deficit = threads_tracked - threads_alive
             state = "ok"
@@ -174,12 +178,12 @@ def thread_nanny(signal_handler):
 
                     from .zmq import try_close, zmq_sockets
 
-                    for s, loc in zmq_sockets.items():  # type: ignore
+                    for s, socket_info in zmq_sockets.items():  # type: ignore
                         try:
                             if s and not s.closed:
                                 log.debug(
                                     "Closing lingering socket",
-                                    extra={"socket": repr(s), "created_at": loc},
+                                    extra={"socket": repr(s), "created_at": socket_info.location},
                                 )
                                 try_close(s)
                         except ZMQError:
@@ -1,11 +1,30 @@
 import inspect
+import pickle
+import sys
+import time
+from collections import deque
+from functools import partial
+from typing import Any
 from weakref import WeakKeyDictionary
 
 import zmq
 from zmq.asyncio import Context as AsyncioContext
 from zmq.error import ZMQError
 
-from . import log
+from . import app_config, log, log_debug
+from .codec import Codec, ContentTypeMismatch, get_codec
+
+# socket provenance modes
+PROVENANCE_OFF = "off"
+PROVENANCE_SHALLOW = "shallow"
+PROVENANCE_FULL = "full"
+PROVENANCE_MODES = (PROVENANCE_OFF, PROVENANCE_SHALLOW, PROVENANCE_FULL)
+
+# send policies when the outgoing queue is at its high-water mark
+SEND_BLOCK = "block"
+SEND_DROP_NEWEST = "drop-newest"
+SEND_DROP_OLDEST = "drop-oldest"
+SEND_POLICIES = (SEND_BLOCK, SEND_DROP_NEWEST, SEND_DROP_OLDEST)
 
 zmq_sockets: WeakKeyDictionary = WeakKeyDictionary()  # type: ignore[type-arg]
 zmq_context = zmq.Context()
@@ -20,19 +39,262 @@ URL_WORKER_PUBLISHER = "inproc://publisher"
 URL_WORKER_RELAY = "inproc://app-relay"
 
 
-def zmq_socket(socket_type: int, is_async: bool | None = False):
-    call_stack = inspect.stack()
-    locations = []
-    for fi in call_stack:
-        locations.append(f"{fi.function} in {fi.filename} @ line {fi.lineno}")
-    location = ", ".join(locations)
-    log.debug(
-        "Creating ZMQ socket",
+def _configured_provenance(mode: str) -> str:
+    if mode in PROVENANCE_MODES:
+        return mode
+    log.warning(
+        "Unsupported socket provenance mode, using the default",
         extra={
+            "zmq_socket_provenance": mode,
+            "supported_modes": PROVENANCE_MODES,
+            "default": PROVENANCE_SHALLOW,
+        },
+    )
+    return PROVENANCE_SHALLOW
+
+
+socket_provenance = _configured_provenance(
+    app_config.get("app", "zmq_socket_provenance", fallback=PROVENANCE_SHALLOW)
+)
+socket_provenance_depth = app_config.getint("app", "zmq_socket_provenance_depth", fallback=8)
+
+
+class SocketInfo:
+    """Registry entry for a socket in zmq_sockets, formatting its creation stack on demand."""
+
+    __slots__ = ("frames", "_location", "codec", "stats")
+
+    def __init__(self, frames: tuple | None = None, location: str | None = None):  # type: ignore[type-arg]
+        # (function, filename, line number) tuples, innermost first
+        self.frames = frames
+        self._location = location
+        # wire codec used by send_obj/recv_obj; None keeps plain pickled frames
+        self.codec: Codec | None = None
+        # send accounting, kept for sockets created with SocketOptions
+        self.stats: SocketStats | None = None
+
+    @property
+    def location(self) -> str | None:
+        if self._location is None and self.frames:
+            self._location = ", ".join(
+                f"{function} in {filename} @ line {lineno}"
+                for function, filename, lineno in self.frames
+            )
+        return self._location
+
+    def __str__(self):
+        return self.location or ""
+
+
+class SocketOptions:
+    def __init__(
+        self,
+        sndhwm: int | None = None,
+        rcvhwm: int | None = None,
+        conflate: bool = False,
+        send_policy: str = SEND_BLOCK,
+        send_timeout_ms: int | None = None,
+        backlog: int = 1000,
+    ):
+        if send_policy not in SEND_POLICIES:
+            raise AssertionError(f"Unsupported send policy: {send_policy}")
+        self.sndhwm = sndhwm
+        self.rcvhwm = rcvhwm
+        self.conflate = conflate
+        self.send_policy = send_policy
+        # how long a send may wait for queue space before the policy applies
+        self.send_timeout_ms = send_timeout_ms
+        # messages held locally under the drop-oldest policy
+        self.backlog = backlog
+
+    def apply(self, socket):
+        if self.sndhwm is not None:
+            socket.setsockopt(zmq.SNDHWM, self.sndhwm)
+        if self.rcvhwm is not None:
+            socket.setsockopt(zmq.RCVHWM, self.rcvhwm)
+        if self.conflate:
+            socket.setsockopt(zmq.CONFLATE, 1)
+        if self.send_policy == SEND_BLOCK and self.send_timeout_ms is not None:
+            socket.setsockopt(zmq.SNDTIMEO, self.send_timeout_ms)
+
+
+class SocketStats:
+    __slots__ = ("queued", "sent", "dropped", "blocked_secs")
+
+    def __init__(self):
+        self.queued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.blocked_secs = 0.0
+
+    def as_dict(self):
+        return {
+            "queued": self.queued,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "blocked_secs": self.blocked_secs,
+        }
+
+
+class ManagedSocket(zmq.Socket):  # type: ignore[type-arg]
+    """Socket that applies a SocketOptions send policy and keeps SocketStats.
+
+    The policy applies per message: to single-frame send() calls and to whole
+    send_multipart() calls. Frames sent individually with SNDMORE bypass it.
+    """
+
+    send_policy: str = SEND_BLOCK
+    send_timeout_ms: int | None = None
+    stats: SocketStats
+    _backlog: deque  # type: ignore[type-arg]
+    _partial: bool = False
+
+    def configure(self, options: SocketOptions, stats: SocketStats):
+        self.send_policy = options.send_policy
+        self.send_timeout_ms = options.send_timeout_ms
+        self.stats = stats
+        self._backlog = deque(maxlen=max(1, options.backlog))
+
+    def send(self, data, flags=0, copy=True, track=False, **kwargs):  # type: ignore[override]
+        if flags & zmq.SNDMORE or self._partial:
+            self._partial = bool(flags & zmq.SNDMORE)
+            return super().send(data, flags=flags, copy=copy, track=track, **kwargs)
+        return self._send_message([data], flags, copy, track)
+
+    def send_multipart(self, msg_parts, flags=0, copy=True, track=False, **kwargs):  # type: ignore[override]
+        return self._send_message(list(msg_parts), flags, copy, track)
+
+    def _send_frames(self, frames, flags, copy, track):
+        for frame in frames[:-1]:
+            super().send(frame, flags=flags | zmq.SNDMORE, copy=copy, track=track)
+        return super().send(frames[-1], flags=flags, copy=copy, track=track)
+
+    def _send_or_wait(self, frames, flags, copy, track):
+        try:
+            return True, self._send_frames(frames, flags | zmq.NOBLOCK, copy, track)
+        except zmq.Again:
+            if not self.send_timeout_ms:
+                return False, None
+        started = time.monotonic()
+        try:
+            if self.poll(timeout=self.send_timeout_ms, flags=zmq.POLLOUT) == 0:
+                return False, None
+            return True, self._send_frames(frames, flags | zmq.NOBLOCK, copy, track)
+        except zmq.Again:
+            return False, None
+        finally:
+            self.stats.blocked_secs += time.monotonic() - started
+
+    def _send_message(self, frames, flags, copy, track):
+        stats = self.stats
+        if self.send_policy == SEND_BLOCK:
+            try:
+                result = self._send_frames(frames, flags | zmq.NOBLOCK, copy, track)
+            except zmq.Again:
+                if flags & zmq.NOBLOCK:
+                    raise
+                started = time.monotonic()
+                try:
+                    # bounded by SNDTIMEO when a send timeout is configured
+                    result = self._send_frames(frames, flags, copy, track)
+                except zmq.Again:
+                    stats.dropped += 1
+                    raise
+                finally:
+                    stats.blocked_secs += time.monotonic() - started
+            stats.sent += 1
+            return result
+        self.flush()
+        if len(self._backlog) == 0:
+            sent, result = self._send_or_wait(frames, flags, copy, track)
+            if sent:
+                stats.sent += 1
+                return result
+        if self.send_policy == SEND_DROP_NEWEST:
+            stats.dropped += 1
+        else:
+            if len(self._backlog) == self._backlog.maxlen:
+                stats.dropped += 1
+            # copy frames that may be reused by the caller
+            self._backlog.append(([bytes(frame) for frame in frames], flags, copy, track))
+            stats.queued = len(self._backlog)
+        return None
+
+    def flush(self) -> int:
+        """Send messages held back under the drop-oldest policy, returning how many remain."""
+        backlog = self._backlog
+        while backlog:
+            frames, flags, copy, track = backlog[0]
+            try:
+                self._send_frames(frames, flags | zmq.NOBLOCK, copy, track)
+            except zmq.Again:
+                break
+            backlog.popleft()
+            self.stats.sent += 1
+        self.stats.queued = len(backlog)
+        return len(backlog)
+
+
+def socket_stats(socket) -> dict[str, int | float] | None:
+    socket_info = zmq_sockets.get(socket)
+    if socket_info is None or socket_info.stats is None:
+        return None
+    return socket_info.stats.as_dict()
+
+
+def set_socket_provenance(mode: str, depth: int | None = None):
+    global socket_provenance
+    global socket_provenance_depth
+    if mode not in PROVENANCE_MODES:
+        raise AssertionError(f"Unsupported socket provenance mode: {mode}")
+    socket_provenance = mode
+    if depth is not None:
+        socket_provenance_depth = depth
+
+
+def _socket_info() -> SocketInfo:
+    if socket_provenance == PROVENANCE_SHALLOW:
+        frames: list[tuple[str, str, int]] = []
+        # skip this function and zmq_socket
+        frame = sys._getframe(2)
+        while frame is not None and len(frames) < socket_provenance_depth:
+            code = frame.f_code
+            frames.append((code.co_name, code.co_filename, frame.f_lineno))
+            frame = frame.f_back  # type: ignore[assignment]
+        return SocketInfo(frames=tuple(frames))
+    elif socket_provenance == PROVENANCE_FULL:
+        locations = []
+        for fi in inspect.stack()[2:]:
+            locations.append(f"{fi.function} in {fi.filename} @ line {fi.lineno}")
+        return SocketInfo(location=", ".join(locations))
+    return SocketInfo()
+
+
+def zmq_socket(
+    socket_type: int,
+    is_async: bool | None = False,
+    codec: str | None = None,
+    options: SocketOptions | None = None,
+):
+    if is_async and options is not None:
+        # send policies and their counters are only implemented for blocking sockets
+        raise AssertionError("Socket options are not supported on asyncio sockets.")
+    socket_info = _socket_info()
+    if codec is not None:
+        socket_info.codec = get_codec(codec)
+    log_debug(
+        "Creating ZMQ socket",
+        lambda: {
             "is_async": is_async,
             "socket_type": socket_type,
-            "socket_types": {"push": zmq.PUSH, "pull": zmq.PULL, "req": zmq.REQ, "rep": zmq.REP},
-            "location": location,
+            "socket_types": {
+                "push": zmq.PUSH,
+                "pull": zmq.PULL,
+                "req": zmq.REQ,
+                "rep": zmq.REP,
+            },
+            "location": socket_info.location,
+            "codec": codec,
         },
     )
     if is_async:
@@ -43,12 +305,79 @@ def zmq_socket(socket_type: int, is_async: bool | None = False):
             zmq_async_context = AsyncioContext.shadow(zmq_context.underlying)
             zmq_async_context.setsockopt(zmq.LINGER, 0)
         socket = zmq_async_context.socket(socket_type)
+    elif options is not None:
+        managed_socket: ManagedSocket = zmq_context.socket(  # type: ignore[assignment]
+            socket_type, socket_class=ManagedSocket
+        )
+        socket_info.stats = SocketStats()
+        managed_socket.configure(options=options, stats=socket_info.stats)
+        socket = managed_socket  # type: ignore[assignment]
     else:
         socket = zmq_context.socket(socket_type)
-    zmq_sockets[socket] = location
+    if options is not None:
+        options.apply(socket)
+    zmq_sockets[socket] = socket_info
     return socket
 
 
+def dump_obj(socket, obj) -> list[bytes]:
+    """Frames that send_obj sends for obj on socket."""
+    socket_info = zmq_sockets.get(socket)
+    if socket_info is None or socket_info.codec is None:
+        return [pickle.dumps(obj, pickle.DEFAULT_PROTOCOL)]
+    codec = socket_info.codec
+    return [codec.content_type, codec.dumps(obj)]
+
+
+def load_obj(socket, frames):
+    """Decode the frames of one message received on socket, as recv_obj does."""
+    socket_info = zmq_sockets.get(socket)
+    if socket_info is None or socket_info.codec is None:
+        return pickle.loads(frames[0])
+    codec = socket_info.codec
+    if len(frames) != 2 or frames[0] != codec.content_type:
+        raise ContentTypeMismatch(
+            f"Expected {codec.content_type!r} message but got {len(frames)} frame(s) "
+            f"starting {frames[0][:32]!r}."
+        )
+    return codec.loads(frames[1])
+
+
+def send_obj(socket, obj, flags: int = 0):
+    socket_info = zmq_sockets.get(socket)
+    if socket_info is None or socket_info.codec is None:
+        return socket.send_pyobj(obj, flags=flags)
+    return socket.send_multipart(dump_obj(socket, obj), flags=flags)
+
+
+def recv_obj(socket, flags: int = 0):
+    socket_info = zmq_sockets.get(socket)
+    if socket_info is None or socket_info.codec is None:
+        return socket.recv_pyobj(flags=flags)
+    return load_obj(socket, socket.recv_multipart(flags=flags))
+
+
+async def recv_obj_async(socket, flags: int = 0):
+    """recv_obj for asyncio sockets."""
+    return load_obj(socket, await socket.recv_multipart(flags=flags))
+
+
+def recv_batch(socket, max_messages: int, linger_secs: float, recv=None) -> list[Any]:
+    """Block for one message, then collect up to max_messages within linger_secs."""
+    if recv is None:
+        recv = partial(recv_obj, socket)
+    batch = [recv()]
+    deadline = time.monotonic() + linger_secs
+    while len(batch) < max_messages:
+        try:
+            batch.append(recv(flags=zmq.NOBLOCK))
+        except zmq.Again:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or socket.poll(timeout=remaining * 1000) == 0:
+                break
+    return batch
+
+
 def zmq_term():
     log.debug("Shutting down ZMQ context...")
     zmq_context.term()
@@ -66,12 +395,15 @@ def try_close(socket):
     if socket is None:
         return
     try:
-        try:
-            location = zmq_sockets[socket]
-            if location:
-                log.debug("Closing socket", extra={"socket": repr(socket), "created_at": location})
-        except KeyError:
-            log.debug("Closing socket", extra={"socket": repr(socket)})
+        socket_info = zmq_sockets.get(socket)
+        # the creation stack is only formatted when the record is emitted
+        log_debug(
+            "Closing socket",
+            lambda: {
+                "socket": repr(socket),
+                "created_at": socket_info.location if socket_info is not None else None,
+            },
+        )
         socket.close()
     except ZMQError:
         log.debug("Ignoring socket error when closing socket.", exc_info=True)
@@ -90,17 +422,36 @@ class Closable:
     def socket_url(self):
         return self._socket_url
 
-    def __init__(self, connect_url: str, socket_type=zmq.PULL, is_async: bool | None = False):
+    def __init__(
+        self,
+        connect_url: str,
+        socket_type=zmq.PULL,
+        is_async: bool | None = False,
+        bind: bool | None = None,
+        codec: str | None = None,
+        options: SocketOptions | None = None,
+    ):
         self._socket = None
         self._socket_url: str = connect_url
         self._socket_type: int = socket_type
         self._is_async: bool | None = is_async
+        self._bind: bool | None = bind
+        self._codec: str | None = codec
+        self._options: SocketOptions | None = options
 
     def get_socket(self):
         if self._socket is None:
-            self._socket = zmq_socket(socket_type=self._socket_type, is_async=self._is_async)
+            self._socket = zmq_socket(
+                socket_type=self._socket_type,
+                is_async=self._is_async,
+                codec=self._codec,
+                options=self._options,
+            )
             assert self._socket is not None
-            if self._socket_type in [zmq.PULL, zmq.PUB, zmq.REP]:
+            bind = self._bind
+            if bind is None:
+                bind = self._socket_type in [zmq.PULL, zmq.PUB, zmq.REP]
+            if bind:
                 log.debug(
                     "Binding ZMQ socket",
                     extra={
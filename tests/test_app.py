@@ -0,0 +1,448 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("zmq", reason="requires the 'mq' extra")
+pytest.importorskip("sentry_sdk", reason="requires the 'monitoring' extra")
+
+from tailucas_pylib.app import ProcessZmqWorker  # noqa: E402
+
+
+def _request(url, message, timeout_ms=5000):
+    import zmq
+
+    from tailucas_pylib.zmq import try_close, zmq_socket
+
+    socket = zmq_socket(zmq.REQ)
+    socket.setsockopt(zmq.RCVTIMEO, timeout_ms)
+    socket.connect(url)
+    try:
+        socket.send_pyobj(message)
+        return socket.recv_pyobj()
+    finally:
+        try_close(socket)
+
+
+def test_zmq_worker_pool_serves_req_callers_concurrently():
+    """Test that a worker pool answers plain REQ callers from several threads."""
+    from tailucas_pylib.app import ZmqWorkerPool
+    from tailucas_pylib.threads import threads_tracked
+
+    class SlowWorker(ZmqWorkerPool):
+        def process_message(self, message):
+            time.sleep(0.2)
+            return {"worker": threading.current_thread().name, **message}
+
+    url = "inproc://test-worker-pool"
+    pool = SlowWorker(name="test-worker-pool", worker_zmq_url=url, pool_size=3)
+    assert pool.pool_size == 3
+    assert {"test-worker-pool", "test-worker-pool (pool 0)"} <= threads_tracked
+    pool.start()
+    try:
+        responses = []
+
+        def call(i):
+            responses.append(_request(url, {"i": i}))
+
+        callers = [threading.Thread(target=call, args=(i,)) for i in range(3)]
+        started = time.monotonic()
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+        elapsed = time.monotonic() - started
+        assert sorted(r["i"] for r in responses) == [0, 1, 2]
+        assert len({r["worker"] for r in responses}) == 3
+        # served in parallel rather than one after the other
+        assert elapsed < 0.55
+    finally:
+        pool.untrack()
+    assert "test-worker-pool (pool 0)" not in threads_tracked
+
+
+def test_zmq_worker_pool_rejects_empty_pool():
+    from tailucas_pylib.app import ZmqWorkerPool
+
+    with pytest.raises(AssertionError):
+        ZmqWorkerPool(name="test-empty-pool", worker_zmq_url="inproc://empty", pool_size=0)
+
+
+
+# defined at module level so that spawned children can unpickle it
+class PidWorker(ProcessZmqWorker):
+    def process_message(self, message):
+        import os
+
+        from tailucas_pylib import app_config
+
+        return {
+            "pid": os.getpid(),
+            "greeting": app_config.get("test", "greeting"),
+            "name": self.name,
+            "repr": repr(self),
+            **message,
+        }
+
+
+def test_process_zmq_worker_serves_from_child_processes():
+    """Test that a process worker answers REQ callers from spawned children."""
+    import os
+
+    from tailucas_pylib import app_config
+    from tailucas_pylib.threads import threads_tracked
+
+    url = "inproc://test-process-worker"
+    if not app_config.has_section("test"):
+        app_config.add_section("test")
+    app_config.set("test", "greeting", "hello")
+    worker = PidWorker(name="test-process-worker", worker_zmq_url=url, pool_size=2)
+    assert "test-process-worker (process 1)" in threads_tracked
+    assert "_pool_workers" not in worker.__getstate__()
+    worker.start()
+    try:
+        response = _request(url, {"i": 1}, timeout_ms=30000)
+        assert response["i"] == 1
+        assert response["pid"] != os.getpid()
+        # children inherit the parent's runtime configuration
+        assert response["greeting"] == "hello"
+        # the unpickled worker is still a usable Thread in the child
+        assert response["name"] == "test-process-worker"
+        assert "test-process-worker" in response["repr"]
+    finally:
+        worker.untrack()
+    assert "test-process-worker (process 1)" not in threads_tracked
+
+
+def test_async_zmq_worker_handles_requests_concurrently():
+    """Test that an async worker overlaps in-flight requests on one event loop."""
+    import asyncio
+
+    from tailucas_pylib.app import AsyncAppThread, AsyncZmqWorker
+
+    class SleepyWorker(AsyncZmqWorker):
+        async def process_message(self, message):
+            await asyncio.sleep(0.2)
+            return {"thread": threading.current_thread().name, **message}
+
+    url = "inproc://test-async-worker"
+    loop_thread = AsyncAppThread(
+        name="test-async-loop", runners=[SleepyWorker(name="test-async-worker", worker_zmq_url=url)]
+    )
+    loop_thread.start()
+    try:
+        responses = []
+
+        def call(i):
+            responses.append(_request(url, {"i": i}))
+
+        callers = [threading.Thread(target=call, args=(i,)) for i in range(5)]
+        started = time.monotonic()
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+        elapsed = time.monotonic() - started
+        assert sorted(r["i"] for r in responses) == list(range(5))
+        assert {r["thread"] for r in responses} == {"test-async-loop"}
+        assert elapsed < 0.9
+    finally:
+        loop_thread.untrack()
+
+
+def test_async_zmq_relay_relays_payload():
+    """Test that an async relay packs source messages onto the sink."""
+    import umsgpack
+    import zmq
+
+    from tailucas_pylib.app import AsyncAppThread, AsyncZmqRelay
+    from tailucas_pylib.zmq import try_close, zmq_socket
+
+    source_url = "inproc://test-async-relay-source"
+    sink_url = "inproc://test-async-relay-sink"
+    sink = zmq_socket(zmq.PULL)
+    sink.setsockopt(zmq.RCVTIMEO, 5000)
+    sink.bind(sink_url)
+    relay = AsyncZmqRelay(name="test-async-relay", source_zmq_url=source_url, sink_zmq_url=sink_url)
+    loop_thread = AsyncAppThread(name="test-async-relay-loop", runners=[relay])
+    loop_thread.start()
+    source = zmq_socket(zmq.PUSH)
+    source.connect(source_url)
+    try:
+        source.send_pyobj({"foo": "bar"})
+        payload = umsgpack.unpackb(sink.recv())
+        assert payload["foo"] == "bar"
+        assert "timestamp" in payload
+    finally:
+        loop_thread.untrack()
+        try_close(source)
+        try_close(sink)
+
+
+
+def test_async_zmq_relay_uses_codec():
+    """Test that an async relay decodes source messages with its codec."""
+    import umsgpack
+    import zmq
+
+    from tailucas_pylib.app import AsyncAppThread, AsyncZmqRelay
+    from tailucas_pylib.zmq import send_obj, try_close, zmq_socket
+
+    source_url = "inproc://test-async-relay-codec-source"
+    sink_url = "inproc://test-async-relay-codec-sink"
+    sink = zmq_socket(zmq.PULL)
+    sink.setsockopt(zmq.RCVTIMEO, 5000)
+    sink.bind(sink_url)
+    relay = AsyncZmqRelay(
+        name="test-async-relay-codec",
+        source_zmq_url=source_url,
+        sink_zmq_url=sink_url,
+        codec="json",
+    )
+    loop_thread = AsyncAppThread(name="test-async-relay-codec-loop", runners=[relay])
+    loop_thread.start()
+    source = zmq_socket(zmq.PUSH, codec="json")
+    source.connect(source_url)
+    try:
+        send_obj(source, {"foo": "bar"})
+        assert umsgpack.unpackb(sink.recv())["foo"] == "bar"
+    finally:
+        loop_thread.untrack()
+        try_close(source)
+        try_close(sink)
+
+def _relay_sockets(name):
+    import zmq
+
+    from tailucas_pylib.zmq import zmq_socket
+
+    sink_url = f"inproc://{name}-sink"
+    sink = zmq_socket(zmq.PULL)
+    sink.setsockopt(zmq.RCVTIMEO, 5000)
+    sink.bind(sink_url)
+    relay_sink = zmq_socket(zmq.PUSH)
+    relay_sink.connect(sink_url)
+    producer = zmq_socket(zmq.PUSH)
+    producer.connect(f"inproc://{name}-source")
+    return producer, relay_sink, sink
+
+
+@pytest.mark.parametrize("batch_format", ["multipart", "array"])
+def test_zmq_relay_batches_drained_messages(batch_format):
+    """Test that a batching relay drains queued messages into one sink message."""
+    import umsgpack
+
+    from tailucas_pylib.app import ZmqRelay
+    from tailucas_pylib.zmq import try_close
+
+    name = f"test-relay-batch-{batch_format}"
+    relay = ZmqRelay(
+        name=name,
+        source_zmq_url=f"inproc://{name}-source",
+        sink_zmq_url=f"inproc://{name}-sink",
+        batch_size=4,
+        batch_latency_ms=50,
+        batch_format=batch_format,
+    )
+    relay.untrack()
+    relay.get_socket()
+    producer, relay_sink, sink = _relay_sockets(name)
+    try:
+        for i in range(6):
+            producer.send_pyobj({"i": i})
+        relay.process_message(sink_socket=relay_sink)
+        relay.process_message(sink_socket=relay_sink)
+        batches = [sink.recv_multipart(), sink.recv_multipart()]
+        if batch_format == "array":
+            assert all(len(frames) == 1 for frames in batches)
+            events = [umsgpack.unpackb(frames[0]) for frames in batches]
+        else:
+            events = [[umsgpack.unpackb(frame) for frame in frames] for frames in batches]
+        assert [[e["i"] for e in batch] for batch in events] == [[0, 1, 2, 3], [4, 5]]
+    finally:
+        relay.close()
+        for socket in (producer, relay_sink, sink):
+            try_close(socket)
+
+
+def test_zmq_relay_rejects_unknown_batch_format():
+    from tailucas_pylib.app import ZmqRelay
+    from tailucas_pylib.threads import threads_tracked
+
+    with pytest.raises(AssertionError):
+        ZmqRelay(
+            name="test-relay-csv",
+            source_zmq_url="inproc://test-relay-csv-source",
+            sink_zmq_url="inproc://test-relay-csv-sink",
+            batch_format="csv",
+        )
+    assert "test-relay-csv" not in threads_tracked
+
+
+def test_zmq_relay_passthrough_forwards_frames_untouched():
+    """Test that a pass-through relay forwards packed frames behind a timestamp frame."""
+    import umsgpack
+
+    from tailucas_pylib.app import ZmqRelay
+    from tailucas_pylib.zmq import try_close
+
+    name = "test-relay-passthrough"
+    relay = ZmqRelay(
+        name=name,
+        source_zmq_url=f"inproc://{name}-source",
+        sink_zmq_url=f"inproc://{name}-sink",
+        batch_size=2,
+        passthrough=True,
+    )
+    relay.untrack()
+    relay.get_socket()
+    producer, relay_sink, sink = _relay_sockets(name)
+    try:
+        bodies = [umsgpack.packb({"i": i}) for i in range(2)]
+        for body in bodies:
+            producer.send(body)
+        assert relay.process_passthrough(sink_socket=relay_sink) == 2
+        timestamp, *frames = sink.recv_multipart()
+        assert timestamp.decode().endswith("Z")
+        assert frames == bodies
+    finally:
+        relay.close()
+        for socket in (producer, relay_sink, sink):
+            try_close(socket)
+
+
+def test_zmq_router_serves_routes_from_one_thread():
+    """Test that one router thread relays several routes, with per-route transforms."""
+    import umsgpack
+    import zmq
+
+    from tailucas_pylib.app import ZmqRouter
+    from tailucas_pylib.zmq import try_close, zmq_socket
+
+    name = "test-router"
+    sink = zmq_socket(zmq.PULL)
+    sink.setsockopt(zmq.RCVTIMEO, 5000)
+    sink.bind(f"inproc://{name}-sink")
+    router = ZmqRouter(
+        name=name,
+        routes=[
+            (f"inproc://{name}-a", f"inproc://{name}-sink"),
+            (f"inproc://{name}-b", f"inproc://{name}-sink", lambda data: [b"b", data.encode()]),
+        ],
+    )
+    router.start()
+    producers = []
+    try:
+        for suffix, message in (("a", {"route": "a"}), ("b", "hello")):
+            producer = zmq_socket(zmq.PUSH)
+            producer.connect(f"inproc://{name}-{suffix}")
+            producer.send_pyobj(message)
+            producers.append(producer)
+        received = [sink.recv_multipart(), sink.recv_multipart()]
+        assert [b"b", b"hello"] in received
+        (packed,) = next(frames for frames in received if frames[0] != b"b")
+        assert umsgpack.unpackb(packed)["route"] == "a"
+        assert router.is_alive()
+    finally:
+        router.untrack()
+        for socket in [sink, *producers]:
+            try_close(socket)
+
+
+def test_pipelined_zmq_worker_replies_out_of_order():
+    """Test that one DEALER client can pipeline requests and match out-of-order replies."""
+    from tailucas_pylib.app import PipelinedZmqClient, PipelinedZmqWorker
+
+    class DelayWorker(PipelinedZmqWorker):
+        def process_message(self, message):
+            time.sleep(message["delay"])
+            return {"i": message["i"]}
+
+    url = "inproc://test-pipelined-worker"
+    worker = DelayWorker(name="test-pipelined-worker", worker_zmq_url=url, max_workers=4)
+    worker.start()
+    client = PipelinedZmqClient(connect_url=url)
+    try:
+        first = client.send({"i": 0, "delay": 0.3})
+        second = client.send({"i": 1, "delay": 0.0})
+        # the quick second request overtakes the slow first one
+        assert client.recv(timeout_ms=5000) == (second, {"i": 1})
+        assert client.recv(timeout_ms=5000) == (first, {"i": 0})
+        started = time.monotonic()
+        responses = client.request_many(
+            [{"i": i, "delay": 0.2} for i in range(4)], timeout_ms=5000
+        )
+        assert [r["i"] for r in responses] == [0, 1, 2, 3]
+        assert time.monotonic() - started < 0.6
+        # plain REQ callers are still served
+        assert _request(url, {"i": 9, "delay": 0.0}) == {"i": 9}
+    finally:
+        worker.untrack()
+        client.close()
+
+
+def test_pipelined_worker_uses_codec():
+    """Test a pipelined worker and its callers exchange codec frames instead of pickles."""
+    import json
+
+    import zmq
+
+    from tailucas_pylib.app import PipelinedZmqClient, PipelinedZmqWorker
+    from tailucas_pylib.codec import CONTENT_TYPE_JSON
+    from tailucas_pylib.zmq import recv_obj, send_obj, try_close, zmq_socket
+
+    class EchoWorker(PipelinedZmqWorker):
+        def process_message(self, message):
+            return {"echo": message["i"]}
+
+    url = "inproc://test-pipelined-worker-codec"
+    worker = EchoWorker(name="test-pipelined-worker-codec", worker_zmq_url=url, codec="json")
+    worker.start()
+    client = PipelinedZmqClient(connect_url=url, codec="json")
+    caller = zmq_socket(zmq.REQ, codec="json")
+    caller.setsockopt(zmq.RCVTIMEO, 5000)
+    caller.connect(url)
+    try:
+        request_id = client.send({"i": 1})
+        socket = client.get_socket()
+        assert socket.poll(timeout=5000)
+        _, reply_id, content_type, body = socket.recv_multipart()
+        assert int.from_bytes(reply_id, "big") == request_id
+        assert (content_type, json.loads(body)) == (CONTENT_TYPE_JSON, {"echo": 1})
+        assert client.request_many([{"i": i} for i in range(3)], timeout_ms=5000) == [
+            {"echo": i} for i in range(3)
+        ]
+        send_obj(caller, {"i": 9})
+        assert recv_obj(caller) == {"echo": 9}
+    finally:
+        worker.untrack()
+        client.close()
+        try_close(caller)
+
+
+def test_pipelined_worker_closes_handler_sockets(monkeypatch):
+    """Test the per-thread result sockets are closed when the worker stops."""
+    from tailucas_pylib import threads
+    from tailucas_pylib.app import PipelinedZmqClient, PipelinedZmqWorker
+
+    class EchoWorker(PipelinedZmqWorker):
+        def process_message(self, message):
+            return message
+
+    url = "inproc://test-pipelined-worker-close"
+    worker = EchoWorker(name="test-pipelined-worker-close", worker_zmq_url=url, max_workers=2)
+    worker.start()
+    client = PipelinedZmqClient(connect_url=url)
+    try:
+        assert client.request_many([{"i": i} for i in range(4)], timeout_ms=5000) == [
+            {"i": i} for i in range(4)
+        ]
+        handler_sockets = list(worker._handler_sockets)
+        assert handler_sockets
+        monkeypatch.setattr(threads, "shutting_down", True)
+        worker.join(timeout=5)
+        assert not worker.is_alive()
+        assert all(handler_socket.closed for handler_socket in handler_sockets)
+    finally:
+        worker.untrack()
+        client.close()
@@ -0,0 +1,88 @@
+import pytest
+
+
+@pytest.mark.parametrize("name", ["pickle", "umsgpack", "msgpack", "json"])
+def test_codec_round_trip(name):
+    """Test each built-in codec round-trips a payload-shaped dict."""
+    if name in ("umsgpack", "msgpack"):
+        pytest.importorskip(name)
+    from tailucas_pylib.codec import get_codec
+
+    codec = get_codec(name)
+    payload = {"timestamp": "1985-10-26T01:21:00Z", "sample_value": 42, "active": True}
+    body = codec.dumps(payload)
+    assert isinstance(body, bytes)
+    assert codec.loads(body) == payload
+    assert get_codec(name) is codec
+
+
+def test_msgpack_codecs_share_content_type():
+    """Test the pure-Python and C msgpack codecs are interchangeable on the wire."""
+    pytest.importorskip("umsgpack")
+    pytest.importorskip("msgpack")
+    from tailucas_pylib.codec import get_codec
+
+    umsgpack_codec = get_codec("umsgpack")
+    msgpack_codec = get_codec("msgpack")
+    assert umsgpack_codec.content_type == msgpack_codec.content_type
+    assert msgpack_codec.loads(umsgpack_codec.dumps({"a": [1, 2]})) == {"a": [1, 2]}
+
+
+def test_unknown_codec():
+    from tailucas_pylib.codec import get_codec
+
+    with pytest.raises(AssertionError):
+        get_codec("xml")
+
+
+def test_register_codec():
+    """Test that a registered codec can be looked up by name."""
+    from tailucas_pylib.codec import Codec, codecs, get_codec, register_codec
+
+    codec = Codec(name="test-utf8", content_type=b"text/plain", dumps=str.encode, loads=bytes.decode)
+    register_codec(codec)
+    try:
+        assert get_codec("test-utf8") is codec
+    finally:
+        codecs.pop("test-utf8")
+
+
+@pytest.mark.parametrize("name", ["umsgpack", "msgpack"])
+def test_msgpack_codecs_ext_types(name):
+    """Test datetimes and devices round-trip as ext types, identically on both codecs."""
+    pytest.importorskip("umsgpack")
+    pytest.importorskip("pydantic")
+    from datetime import UTC, datetime
+
+    from tailucas_pylib.codec import get_codec
+    from tailucas_pylib.device import Device
+
+    codec = get_codec(name)
+    device = Device(device_key="key", device_type="sensor", image=b"\x00\x01", type="input")
+    payload = {
+        "when": datetime(1985, 10, 26, 1, 21, 0, 123456, tzinfo=UTC),
+        "naive": datetime(1985, 10, 26, 1, 21, 0),
+        "device": device,
+    }
+    body = codec.dumps(payload)
+    decoded = codec.loads(body)
+    assert decoded["when"] == payload["when"]
+    assert decoded["naive"] == datetime(1985, 10, 26, 1, 21, 0, tzinfo=UTC)
+    assert isinstance(decoded["device"], Device)
+    assert decoded["device"] == device
+    # existing umsgpack peers read the same bytes
+    assert get_codec("umsgpack").dumps(payload) == body
+
+
+def test_msgpack_codec_falls_back_to_umsgpack(monkeypatch):
+    """Test the msgpack codec uses umsgpack when the C extension is not installed."""
+    umsgpack = pytest.importorskip("umsgpack")
+    import sys
+
+    from tailucas_pylib.codec import CONTENT_TYPE_MSGPACK, _msgpack_codec
+
+    monkeypatch.setitem(sys.modules, "msgpack", None)
+    codec = _msgpack_codec()
+    assert codec.name == "msgpack"
+    assert codec.content_type == CONTENT_TYPE_MSGPACK
+    assert umsgpack.unpackb(codec.dumps({"a": [1, 2]})) == {"a": [1, 2]}
@@ -86,4 +86,85 @@ def test_make_payload_debug_logging(caplog):
             make_payload(timestamp="1985-10-26T01:21:00-00:00", data={"test": "debug"}, pack=False)
         assert caplog.text != ""
     finally:
-        log.setLevel(old_level)
\ No newline at end of file
+        log.setLevel(old_level)
+
+
+def test_make_payload_with_codec():
+    """Test make_payload packs with the selected codec."""
+    import json
+
+    from tailucas_pylib.data import make_payload
+
+    result = make_payload(timestamp="1985-10-26T01:21:00-00:00", data={"x": 1}, codec="json")
+    assert json.loads(result) == {"timestamp": "1985-10-26T01:21:00Z", "x": 1}
+
+
+def test_lazy_payload_and_header_check():
+    """Test packed payloads pass the header check and decode only when read."""
+    from tailucas_pylib.data import LazyPayload, is_packed_map, make_payload
+
+    body = make_payload(timestamp="1985-10-26T01:21:00-00:00", data={"value": 1})
+    assert is_packed_map(body)
+    assert not is_packed_map(b"")
+    assert not is_packed_map(b"\x93\x01\x02\x03")
+    payload = LazyPayload(body)
+    assert payload._value is None
+    assert payload["value"] == 1
+    assert payload.get("missing") is None
+
+
+def test_make_payload_compresses_above_threshold():
+    """Test large payloads are compressed behind a header and small ones are left alone."""
+    from tailucas_pylib.data import (
+        COMPRESSED_MARKER,
+        is_packed_map,
+        make_payload,
+        unpack_payload,
+    )
+
+    image = b"\x00" * 4096
+    small = make_payload(data={"value": 1}, compress_threshold=1024)
+    large = make_payload(data={"image": image}, compress_threshold=1024)
+    assert small[0] != COMPRESSED_MARKER
+    assert large[0] == COMPRESSED_MARKER
+    assert len(large) < len(image)
+    assert is_packed_map(large)
+    assert unpack_payload(large)["image"] == image
+    assert unpack_payload(small)["value"] == 1
+
+
+def test_compress_payload_zlib_round_trip():
+    """Test zlib compression round-trips and incompressible bodies are sent as they are."""
+    import os
+
+    from tailucas_pylib.data import COMPRESSION_ZLIB, compress_payload, decompress_payload
+
+    body = b"abc" * 1000
+    compressed = compress_payload(body, compression=COMPRESSION_ZLIB)
+    assert compressed[:2] == b"\xc1\x01"
+    assert decompress_payload(compressed) == body
+    noise = os.urandom(64)
+    assert compress_payload(noise, compression=COMPRESSION_ZLIB) == noise
+
+
+def test_payload_compression_setting_is_checked_on_load():
+    """Test payloads default to zlib and an unusable compression setting fails at load."""
+    from tailucas_pylib import data
+
+    assert data.payload_compression == data.COMPRESSION_ZLIB
+    with pytest.raises(AssertionError):
+        data._configured_compression("brotli")
+    try:
+        import lz4.frame  # noqa: F401
+    except ImportError:
+        with pytest.raises(AssertionError):
+            data._configured_compression(data.COMPRESSION_LZ4)
+
+
+def test_decompress_payload_rejects_bad_data():
+    from tailucas_pylib.data import decompress_payload
+
+    with pytest.raises(ValueError):
+        decompress_payload(b"\xc1\x09body")
+    with pytest.raises(ValueError):
+        decompress_payload(b"\xc1\x01not zlib")
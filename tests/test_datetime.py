@@ -100,3 +100,150 @@ def test_make_timestamp_with_fully_invalid_string():
 
     result = make_timestamp(timestamp="not-a-date-and-not-a-number")
     assert result is not None
+
+
+def test_utc_iso_now_reuses_string_within_second(mocker):
+    """Test the current second is formatted once and matches the full formatting path."""
+    pytz = pytest.importorskip("pytz")
+    import tailucas_pylib.datetime as datetime_module
+
+    mocker.patch("time.time", return_value=499137660.75)
+    strftime = mocker.spy(datetime_module.time, "strftime")
+    assert datetime_module.utc_iso_now() == "1985-10-26T01:21:00Z"
+    assert datetime_module.make_iso_timestamp() == "1985-10-26T01:21:00Z"
+    assert strftime.call_count == 1
+    assert datetime_module.make_iso_timestamp(
+        timestamp=499137660.75, as_tz=pytz.utc
+    ) == datetime_module.utc_iso_now()
+
+
+def test_parse_timestamp_tiers(mocker):
+    """Test ISO and epoch strings skip dateutil, which is cached for everything else."""
+    pytz = pytest.importorskip("pytz")
+    import dateutil.parser
+
+    from tailucas_pylib.datetime import _parse_full_date, parse_timestamp
+
+    expected = datetime(1985, 10, 26, 1, 21, 0, tzinfo=pytz.utc)
+    parse = mocker.spy(dateutil.parser, "parse")
+    _parse_full_date.cache_clear()
+    assert parse_timestamp("1985-10-26T01:21:00Z") == expected
+    assert parse_timestamp("499137660") == expected
+    parse.assert_not_called()
+    for _ in range(3):
+        assert parse_timestamp("Sat, 26 Oct 1985 01:21:00 +0000") == expected
+    parse.assert_called_once()
+    with pytest.raises(ValueError):
+        parse_timestamp("9" * 30)
+
+
+def test_parse_timestamp_partial_dates_follow_today(mocker):
+    """Test partial dates are filled in from today's date on every call, not from the cache."""
+    from tailucas_pylib import datetime as tailucas_datetime
+    from tailucas_pylib.datetime import parse_timestamp
+
+    today = mocker.patch.object(tailucas_datetime, "_today", return_value=datetime(2026, 10, 18))
+    assert parse_timestamp("10:30") == datetime(2026, 10, 18, 10, 30)
+    assert parse_timestamp("1985") == datetime(1985, 10, 18)
+    today.return_value = datetime(2026, 10, 19)
+    assert parse_timestamp("10:30") == datetime(2026, 10, 19, 10, 30)
+    assert parse_timestamp("1985") == datetime(1985, 10, 19)
+    # a full date on the first of January is still a full date
+    assert parse_timestamp("1 Jan 2000 10:30") == datetime(2000, 1, 1, 10, 30)
+
+
+def test_make_unix_timestamp_numeric_fast_path():
+    from tailucas_pylib.datetime import make_unix_timestamp
+
+    assert make_unix_timestamp(timestamp=499137660.9) == 499137660
+    assert make_unix_timestamp(timestamp="499137660") == 499137660
+
+
+@pytest.fixture
+def setup_batch_timestamps(setup_datetime_datetime_notz, setup_datetime_datetime):
+    return [
+        0,
+        499137660,
+        499137660.75,
+        -1.5,
+        "499137660",
+        "1985-10-26T01:21:00Z",
+        "1985-10-26T01:21:00.999999-04:00",
+        "1985-10-26 01:21:00",
+        "Sat Oct 26 01:21:00 UTC 1985",
+        setup_datetime_datetime_notz,
+        setup_datetime_datetime,
+    ]
+
+
+@pytest.mark.parametrize("with_numpy", [False, True])
+def test_batch_timestamps_match_scalar(setup_batch_timestamps, with_numpy, monkeypatch):
+    pytz = pytest.importorskip("pytz")
+    from tailucas_pylib import datetime as tl_datetime
+
+    if with_numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(tl_datetime, "_numpy", lambda: None)
+    for as_tz in (pytz.utc, pytz.timezone("US/Eastern")):
+        unix_timestamps = tl_datetime.make_unix_timestamps(setup_batch_timestamps, as_tz=as_tz)
+        iso_timestamps = tl_datetime.make_iso_timestamps(setup_batch_timestamps, as_tz=as_tz)
+        assert list(unix_timestamps) == [
+            tl_datetime.make_unix_timestamp(t, as_tz=as_tz) for t in setup_batch_timestamps
+        ]
+        assert list(iso_timestamps) == [
+            tl_datetime.make_iso_timestamp(t, as_tz=as_tz) for t in setup_batch_timestamps
+        ]
+
+
+def test_batch_timestamps_numpy_epochs():
+    np = pytest.importorskip("numpy")
+    from tailucas_pylib.datetime import make_iso_timestamps, make_unix_timestamps
+
+    epochs = np.array([0.0, 499137660.75, -1.5])
+    assert make_unix_timestamps(epochs).tolist() == [0, 499137660, -1]
+    assert make_iso_timestamps(epochs).tolist() == [
+        "1970-01-01T00:00:00Z",
+        "1985-10-26T01:21:00Z",
+        "1969-12-31T23:59:58Z",
+    ]
+    assert make_unix_timestamps(np.array([], dtype=np.int64)).tolist() == []
+    from tailucas_pylib.datetime import make_iso_timestamp, make_unix_timestamp
+
+    floats = [0.9999999, 1700000000.5, -0.25, 2**31 + 0.1]
+    assert make_unix_timestamps(floats).tolist() == [make_unix_timestamp(t) for t in floats]
+    assert make_iso_timestamps(floats).tolist() == [make_iso_timestamp(t) for t in floats]
+
+
+def test_batch_timestamps_numpy_non_utc():
+    np = pytest.importorskip("numpy")
+    pytz = pytest.importorskip("pytz")
+    from tailucas_pylib.datetime import (
+        make_iso_timestamp,
+        make_iso_timestamps,
+        make_unix_timestamp,
+        make_unix_timestamps,
+    )
+
+    eastern = pytz.timezone("US/Eastern")
+    epochs = np.array([0, 499137660], dtype=np.int64)
+    expected_unix = [make_unix_timestamp(int(t), as_tz=eastern) for t in epochs]
+    expected_iso = [make_iso_timestamp(int(t), as_tz=eastern) for t in epochs]
+    assert make_unix_timestamps(epochs, as_tz=eastern).tolist() == expected_unix
+    assert make_iso_timestamps(epochs, as_tz=eastern).tolist() == expected_iso
+    assert make_iso_timestamps(list(epochs), as_tz=eastern).tolist() == expected_iso
+
+
+def test_parse_timestamp_short_digits_use_dateutil():
+    """Test digit strings shorter than an epoch still parse as dates."""
+    pytz = pytest.importorskip("pytz")
+    from tailucas_pylib.datetime import make_timestamp, parse_timestamp
+
+    assert parse_timestamp("1985").year == 1985
+    assert make_timestamp("1985").year == 1985
+    assert parse_timestamp("19851026") == datetime(1985, 10, 26)
+    # epochs in seconds and milliseconds skip dateutil
+    assert parse_timestamp("1700000000") == datetime(2023, 11, 14, 22, 13, 20, tzinfo=pytz.utc)
+    assert parse_timestamp("1700000000500") == datetime(
+        2023, 11, 14, 22, 13, 20, 500000, tzinfo=pytz.utc
+    )
@@ -30,4 +30,31 @@ def test_exec_cmd_log(caplog):
         getattr(record, "exit_code", None) == 0
         and "log-test" in getattr(record, "stdout", "")
         for record in caplog.records
-    )
\ No newline at end of file
+    )
+
+
+def test_signal_handler_hup_refreshes_debug_enabled():
+    """Test the SIGHUP level toggle is seen by the cached debug_enabled check."""
+    import logging
+    import signal
+
+    from tailucas_pylib import debug_enabled, log, log_debug
+    from tailucas_pylib.process import SignalHandler
+
+    old_level = log.level
+    with patch("signal.signal"):
+        handler = SignalHandler()
+    build_extra = []
+    try:
+        log.setLevel(logging.INFO)
+        assert not debug_enabled()
+        log_debug("Not built", lambda: build_extra.append(1) or {})
+        assert build_extra == []
+        handler.hup(signal.SIGHUP, None)
+        assert debug_enabled()
+        log_debug("Built", lambda: build_extra.append(1) or {})
+        assert build_extra == [1]
+        handler.hup(signal.SIGHUP, None)
+        assert not debug_enabled()
+    finally:
+        log.setLevel(old_level)
@@ -0,0 +1,855 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+pytest.importorskip("pika", reason="requires the 'mq' extra")
+pytest.importorskip("umsgpack", reason="requires the 'mq' extra")
+pytest.importorskip("zmq", reason="requires the 'mq' extra")
+pytest.importorskip("sentry_sdk", reason="requires the 'monitoring' extra")
+
+
+class FakeBroker:
+    """Stands in for a blocking connection and channel, confirming on event processing."""
+
+    def __init__(self, nack_tags=()):
+        self.published = []
+        self.nack_tags = set(nack_tags)
+        self.confirm_callback = None
+        self.is_open = True
+        self.is_closed = False
+        self._pending_tags = []
+        self._impl = SimpleNamespace(
+            confirm_delivery=self._confirm_delivery, basic_publish=self._basic_publish
+        )
+
+    def _confirm_delivery(self, ack_nack_callback, callback=None):
+        self.confirm_callback = ack_nack_callback
+        callback(SimpleNamespace(method=None))
+
+    def _basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        self.published.append((routing_key, body))
+        self._pending_tags.append(len(self.published))
+
+    def process_data_events(self, time_limit=0):
+        import pika
+
+        for tag in self._pending_tags:
+            if tag in self.nack_tags:
+                self.nack_tags.discard(tag)
+                method = pika.spec.Basic.Nack(delivery_tag=tag)
+            else:
+                method = pika.spec.Basic.Ack(delivery_tag=tag)
+            self.confirm_callback(SimpleNamespace(method=method))
+        self._pending_tags = []
+
+
+def test_confirmed_publisher_acks_and_retries_nacks():
+    """Test that nacked messages are published again and acked ones are forgotten."""
+    from tailucas_pylib.rabbit import ConfirmedPublisher
+
+    broker = FakeBroker(nack_tags=[2])
+    publisher = ConfirmedPublisher(window=10)
+    publisher.attach(connection=broker, channel=broker)
+    for i in range(3):
+        publisher.publish(exchange="ex", routing_key=f"key.{i}", body=b"%d" % i)
+    assert publisher.flush(timeout=1) == 0
+    # the nack for key.1 is seen before key.2 is published
+    assert [key for key, _ in broker.published] == ["key.0", "key.1", "key.1", "key.2"]
+    assert (publisher.acked, publisher.nacked, publisher.dropped) == (3, 1, 0)
+
+
+def test_confirmed_publisher_multiple_ack_and_lost_channel():
+    """Test multiple-acks clear a range and unconfirmed messages survive a channel loss."""
+    import pika
+
+    from tailucas_pylib.rabbit import ConfirmedPublisher
+
+    broker = FakeBroker()
+    # hold confirms back so that messages stay unconfirmed
+    broker.process_data_events = lambda time_limit=0: None
+    publisher = ConfirmedPublisher(window=10)
+    publisher.attach(connection=broker, channel=broker)
+    for i in range(4):
+        publisher.publish(exchange="ex", routing_key=f"key.{i}", body=b"")
+    broker.confirm_callback(
+        SimpleNamespace(method=pika.spec.Basic.Ack(delivery_tag=2, multiple=True))
+    )
+    assert publisher.pending == 2
+    # a new channel replaces the lost one; keys 2 and 3 are sent again
+    replacement = FakeBroker()
+    publisher.attach(connection=replacement, channel=replacement)
+    assert publisher.flush(timeout=1) == 0
+    assert [key for key, _ in replacement.published] == ["key.2", "key.3"]
+
+
+def test_confirmed_publisher_full_window_on_closed_channel():
+    """Test a full window on a closed channel raises rather than waiting forever."""
+    from tailucas_pylib.rabbit import ConfirmedPublisher
+
+    broker = FakeBroker()
+    broker.process_data_events = lambda time_limit=0: None
+    publisher = ConfirmedPublisher(window=2, confirm_timeout=0.1)
+    publisher.attach(connection=broker, channel=broker)
+    for i in range(2):
+        publisher.publish(exchange="ex", routing_key=f"key.{i}", body=b"")
+    broker.is_open = False
+    with pytest.raises(ResourceWarning):
+        publisher.publish(exchange="ex", routing_key="key.2", body=b"")
+    # the unconfirmed messages wait for the next channel; key.2 stays with the caller
+    assert publisher.pending == 2
+    broker.is_open = True
+    publisher.attach(connection=broker, channel=broker)
+    with pytest.raises(ResourceWarning):
+        # confirms never arrive, so the wait is bounded by the confirm timeout
+        publisher.publish(exchange="ex", routing_key="key.2", body=b"")
+    assert publisher.pending == 2
+
+
+def test_mq_connection_stop_flushes_confirms(mocker):
+    """Test stop waits for outstanding publisher confirms before closing the channel."""
+    from tailucas_pylib.rabbit import MQConnection
+
+    broker = FakeBroker()
+    broker.channel = lambda: broker
+    broker.close = MagicMock()
+    broker.exchange_declare = MagicMock()
+    broker.queue_declare = MagicMock(
+        return_value=SimpleNamespace(method=SimpleNamespace(queue="amq.gen-test"))
+    )
+    mocker.patch("pika.BlockingConnection", return_value=broker)
+    connection = MQConnection(
+        name="test-stop-confirms",
+        mq_server_address="localhost",
+        mq_exchange_name="home",
+        mq_publisher_confirms=True,
+    )
+    connection.untrack()
+    process_data_events = broker.process_data_events
+    broker.process_data_events = lambda time_limit=0: None
+    connection._basic_publish(routing_key="event.test", event_payload={"foo": "bar"})
+    assert connection._mq_publisher.pending == 1
+    broker.process_data_events = process_data_events
+    connection.stop()
+    assert connection._mq_publisher.pending == 0
+    assert connection._mq_publisher.acked == 1
+
+
+def test_mq_connection_publishes_through_confirm_pipeline(mocker):
+    """Test MQConnection routes publishes through the confirm pipeline when enabled."""
+    from tailucas_pylib.rabbit import MQConnection
+
+    broker = FakeBroker()
+    broker.channel = lambda: broker
+    broker.exchange_declare = MagicMock()
+    broker.queue_declare = MagicMock(
+        return_value=SimpleNamespace(method=SimpleNamespace(queue="amq.gen-test"))
+    )
+    mocker.patch("pika.BlockingConnection", return_value=broker)
+    connection = MQConnection(
+        name="test-confirms",
+        mq_server_address="localhost",
+        mq_exchange_name="home",
+        mq_publisher_confirms=True,
+    )
+    connection.untrack()
+    connection._basic_publish(routing_key="event.test", event_payload={"foo": "bar"})
+    assert connection.flush_confirms(timeout=1) == 0
+    assert [key for key, _ in broker.published] == ["event.test"]
+
+
+def test_mq_connection_confirmed_publish_survives_lost_stream(mocker):
+    """Test a message sent before the stream is lost is published again only once."""
+    from pika.exceptions import StreamLostError
+
+    from tailucas_pylib.rabbit import MQConnection
+
+    brokers = []
+    for _ in range(2):
+        broker = FakeBroker()
+        broker.channel = lambda broker=broker: broker
+        broker.close = MagicMock()
+        broker.exchange_declare = MagicMock()
+        broker.queue_declare = MagicMock(
+            return_value=SimpleNamespace(method=SimpleNamespace(queue="amq.gen-test"))
+        )
+        brokers.append(broker)
+    lost, replacement = brokers
+
+    def lose_stream(time_limit=0):
+        lost.is_open, lost.is_closed = False, True
+        raise StreamLostError("Stream connection lost")
+
+    lost.process_data_events = lose_stream
+    blocking = mocker.patch("pika.BlockingConnection", side_effect=brokers)
+    connection = MQConnection(
+        name="test-confirms-lost-stream",
+        mq_server_address="localhost",
+        mq_exchange_name="home",
+        mq_publisher_confirms=True,
+    )
+    connection.untrack()
+    connection._basic_publish(routing_key="event.a", event_payload={"foo": "bar"})
+    assert [key for key, _ in lost.published] == ["event.a"]
+    assert blocking.call_count == 1
+    assert connection._mq_publisher.pending == 1
+    connection._basic_publish(routing_key="event.b", event_payload={"foo": "bar"})
+    assert [key for key, _ in replacement.published] == ["event.a", "event.b"]
+    assert connection.flush_confirms(timeout=1) == 0
+
+
+def test_rabbitmq_relay_publishes_batch_with_one_flush(mocker):
+    """Test a lingering relay publishes a burst of messages and flushes the connection once."""
+    import zmq
+
+    from tailucas_pylib.rabbit import RabbitMQRelay
+    from tailucas_pylib.zmq import try_close, zmq_socket
+
+    broker = FakeBroker()
+    broker.channel = lambda: broker
+    broker.exchange_declare = MagicMock()
+    broker.process_data_events = MagicMock()
+    mocker.patch("pika.BlockingConnection", return_value=broker)
+    relay = RabbitMQRelay(
+        zmq_url="inproc://test-rabbit-relay-batch",
+        mq_server_address="localhost",
+        mq_exchange_name="home",
+        mq_topic_filter="event.#",
+        mq_exchange_type="topic",
+        mq_batch_size=8,
+        mq_batch_linger_ms=20,
+    )
+    relay.untrack()
+    source = zmq_socket(zmq.PULL)
+    source.bind("inproc://test-rabbit-relay-batch")
+    producer = zmq_socket(zmq.PUSH)
+    producer.connect("inproc://test-rabbit-relay-batch")
+    try:
+        for i in range(3):
+            producer.send_pyobj((f"event.{i}", {"value": i}))
+        relay.process_message(zmq_socket=source)
+    finally:
+        try_close(producer)
+        try_close(source)
+    assert [key for key, _ in broker.published] == ["event.0", "event.1", "event.2"]
+    broker.process_data_events.assert_called_once_with(time_limit=0)
+    assert (relay.batches_published, relay.messages_published, relay.last_batch_size) == (1, 3, 3)
+
+
+class FakeSelectConnection:
+    """Stands in for a pika SelectConnection on a real select I/O loop."""
+
+    instances: list = []
+
+    def __init__(self, parameters, on_open_callback, on_open_error_callback, on_close_callback):
+        from pika.adapters.select_connection import IOLoop
+
+        self.ioloop = IOLoop()
+        self.is_open = True
+        self.published = []
+        self.on_message_callback = None
+        self._on_close_callback = on_close_callback
+        self.instances.append(self)
+        self.ioloop.add_callback_threadsafe(lambda: on_open_callback(self))
+
+    def channel(self, on_open_callback):
+        on_open_callback(self)
+
+    def add_on_close_callback(self, callback):
+        pass
+
+    def exchange_declare(self, exchange, exchange_type, arguments=None, callback=None):
+        callback(None)
+
+    def queue_declare(self, queue, exclusive=False, callback=None):
+        callback(SimpleNamespace(method=SimpleNamespace(queue="amq.gen-test")))
+
+    def queue_bind(self, queue, exchange, routing_key=None, callback=None):
+        callback(None)
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False):
+        self.on_message_callback = on_message_callback
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        self.published.append((routing_key, body))
+
+    def close(self):
+        self.is_open = False
+        self._on_close_callback(self, None)
+
+
+def _wait_for(condition, timeout=5):
+    import time
+
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_rabbitmq_relay_select_engine(mocker):
+    """Test the select engine drains ZMQ into publishes on the connection's I/O loop."""
+    import umsgpack
+    import zmq
+
+    from tailucas_pylib.rabbit import ENGINE_SELECT, RabbitMQRelay
+    from tailucas_pylib.zmq import try_close, zmq_socket
+
+    FakeSelectConnection.instances = []
+    mocker.patch("pika.SelectConnection", FakeSelectConnection)
+    blocking = mocker.patch("pika.BlockingConnection")
+    relay = RabbitMQRelay(
+        zmq_url="inproc://test-rabbit-relay-select",
+        mq_server_address="localhost",
+        mq_exchange_name="home",
+        mq_topic_filter="event.#",
+        mq_exchange_type="topic",
+        engine=ENGINE_SELECT,
+    )
+    relay.untrack()
+    blocking.assert_not_called()
+    relay.start()
+    producer = zmq_socket(zmq.PUSH)
+    producer.connect("inproc://test-rabbit-relay-select")
+    try:
+        for i in range(3):
+            producer.send_pyobj((f"event.{i}", {"value": i}))
+        _wait_for(lambda: relay.messages_published == 3)
+    finally:
+        relay.close()
+        relay.join(timeout=5)
+        try_close(producer)
+    assert not relay.is_alive()
+    (connection,) = FakeSelectConnection.instances
+    assert [key for key, _ in connection.published] == ["event.0", "event.1", "event.2"]
+    assert umsgpack.unpackb(connection.published[2][1])["value"] == 2
+
+
+def test_select_engine_holds_publishes_until_ready(mocker):
+    """Test the select engine holds publishes made before its channel is ready."""
+    from tailucas_pylib import rabbit
+    from tailucas_pylib.rabbit import SelectEngine
+
+    mocker.patch.object(rabbit, "SELECT_PENDING_LIMIT", 2)
+    engine = SelectEngine(parameters=(), exchange_name="home", exchange_type="topic")
+    for i in range(3):
+        engine.publish(routing_key=f"event.{i}", body=b"")
+    assert engine.dropped == 1
+    channel = MagicMock(is_open=True)
+    engine._channel = channel
+    engine._connection = MagicMock()
+    engine._on_ready()
+    assert [call.kwargs["routing_key"] for call in channel.basic_publish.call_args_list] == [
+        "event.0",
+        "event.1",
+    ]
+    engine.publish(routing_key="event.3", body=b"")
+    assert channel.basic_publish.call_count == 3
+
+
+def test_zmq_listener_select_engine(mocker):
+    """Test the select engine consumes into ZMQ and publishes from other threads."""
+    import zmq
+
+    from tailucas_pylib.data import make_payload
+    from tailucas_pylib.rabbit import ENGINE_SELECT, ZMQListener
+    from tailucas_pylib.zmq import try_close, zmq_socket
+
+    FakeSelectConnection.instances = []
+    mocker.patch("pika.SelectConnection", FakeSelectConnection)
+    sink = zmq_socket(zmq.PULL)
+    sink.setsockopt(zmq.RCVTIMEO, 5000)
+    sink.bind("inproc://test-zmq-listener-select")
+    listener = ZMQListener(
+        zmq_url="inproc://test-zmq-listener-select",
+        mq_server_address="localhost",
+        mq_exchange_name="home",
+        mq_topic_filter="event.#",
+        mq_exchange_type="topic",
+        engine=ENGINE_SELECT,
+    )
+    listener.untrack()
+    listener.start()
+    try:
+        _wait_for(lambda: FakeSelectConnection.instances)
+        connection = FakeSelectConnection.instances[0]
+        _wait_for(lambda: connection.on_message_callback is not None)
+        method = SimpleNamespace(routing_key="event.device.sensor")
+        connection.ioloop.add_callback_threadsafe(
+            lambda: connection.on_message_callback(
+                connection, method, None, make_payload(data={"value": 1})
+            )
+        )
+        assert sink.recv_pyobj()["sensor"]["value"] == 1
+        listener._basic_publish(routing_key="event.out", event_payload={"value": 2})
+        _wait_for(lambda: connection.published)
+        assert connection.published[0][0] == "event.out"
+    finally:
+        listener.stop()
+        listener.join(timeout=5)
+        try_close(sink)
+    assert not listener.is_alive()
+
+
+def _mock_blocking_connection():
+    connection = MagicMock(is_open=True, is_closed=False)
+
+    def channel():
+        channel = MagicMock(is_open=True, is_closed=False, consumer_tags=[])
+        channel.queue_declare.return_value = SimpleNamespace(
+            method=SimpleNamespace(queue=f"amq.gen-{connection.channel.call_count}")
+        )
+        return channel
+
+    connection.channel.side_effect = channel
+    return connection
+
+
+def _mock_threaded_connection():
+    """A mock blocking connection that runs thread-safe callbacks when processing events."""
+    import queue
+
+    connection = _mock_blocking_connection()
+    callbacks = queue.Queue()
+    connection.add_callback_threadsafe.side_effect = callbacks.put
+
+    def process_data_events(time_limit=0):
+        try:
+            callbacks.get(timeout=min(time_limit, 0.05))()
+        except queue.Empty:
+            pass
+
+    def close():
+        connection.is_open = False
+        connection.is_closed = True
+
+    connection.process_data_events.side_effect = process_data_events
+    connection.close.side_effect = close
+    return connection
+
+
+def test_connection_pool_shares_connection_and_declarations(mocker):
+    """Test pooled instances on different threads share a connection, channels and declares."""
+    import threading
+
+    from tailucas_pylib.rabbit import MQConnection, connection_pool
+
+    blocking = mocker.patch("pika.BlockingConnection", return_value=_mock_threaded_connection())
+    connections = []
+    for i in range(2):
+        connection = MQConnection(
+            name=f"test-pool-{i}",
+            mq_server_address="localhost",
+            mq_exchange_name="home",
+            mq_connection_pool=True,
+        )
+        connection.untrack()
+        connections.append(connection)
+    publishing_threads = set()
+    try:
+        first = threading.Thread(
+            target=connections[0]._basic_publish,
+            args=("event.a", {"value": 1}),
+            kwargs={"close_channel": True},
+        )
+        first.start()
+        first.join(timeout=5)
+        connections[1]._basic_publish("event.b", {"value": 2})
+        blocking.assert_called_once()
+        pooled = connections[1]._mq_pooled
+        assert pooled is connection_pool.get(connections[1]._pika_parameters)
+        # the channel released by the first publish is leased by the second
+        assert pooled.connection.channel.call_count == 1
+        channel = connections[1]._mq_channel
+        channel.exchange_declare.assert_called_once()
+        assert channel.basic_publish.call_count == 2
+        channel.basic_publish.side_effect = lambda **kwargs: publishing_threads.add(
+            threading.get_ident()
+        )
+        connections[1]._basic_publish("event.c", {"value": 3})
+        # channel operations run on the pool's I/O thread
+        assert publishing_threads == {pooled._thread.ident}
+    finally:
+        for connection in connections:
+            connection.stop()
+    assert pooled.leases == 0
+    pooled.connection.close.assert_called_once()
+    assert not pooled._thread.is_alive()
+    assert connection_pool._connections == {}
+
+
+def test_rabbitmq_relay_pooled_close_closes_spool(mocker, tmp_path):
+    """Test a pooled relay releases its channel and closes its spool."""
+    from tailucas_pylib.rabbit import RabbitMQRelay, connection_pool
+
+    mocker.patch("pika.BlockingConnection", return_value=_mock_threaded_connection())
+    relay = RabbitMQRelay(
+        zmq_url="inproc://test-rabbit-relay-pooled",
+        mq_server_address="localhost",
+        mq_exchange_name="home",
+        mq_topic_filter="event.#",
+        mq_exchange_type="topic",
+        mq_connection_pool=True,
+        spool_path=str(tmp_path / "relay.spool"),
+    )
+    relay.untrack()
+    relay._send([("event.a", b"\x80")])
+    assert relay.messages_published == 1
+    pooled = relay._mq_pooled
+    relay.close()
+    assert relay._spool._mmap.closed
+    assert not pooled._thread.is_alive()
+    assert connection_pool._connections == {}
+
+
+def test_mq_connection_reuses_exclusive_queue_on_channel_rebuild(mocker):
+    """Test a rebuilt channel on the same connection keeps the exclusive queue."""
+    from tailucas_pylib.rabbit import MQConnection
+
+    blocking = mocker.patch("pika.BlockingConnection", return_value=_mock_blocking_connection())
+    connection = MQConnection(
+        name="test-queue-reuse", mq_server_address="localhost", mq_exchange_name="home"
+    )
+    connection.untrack()
+    connection._basic_publish("event.a", {"value": 1}, close_channel=True)
+    connection._mq_channel.is_closed = True
+    connection._basic_publish("event.b", {"value": 2})
+    assert blocking.return_value.channel.call_count == 2
+    assert connection._mq_queue_name == "amq.gen-1"
+    connection._mq_channel.queue_declare.assert_not_called()
+
+
+def test_zmq_listener_prefetch_batches_acks(mocker):
+    """Test a prefetching listener acknowledges forwarded deliveries with multiple-acks."""
+    from tailucas_pylib.data import make_payload
+    from tailucas_pylib.rabbit import ZMQListener
+
+    blocking = mocker.patch("pika.BlockingConnection", return_value=_mock_blocking_connection())
+    listener = ZMQListener(
+        zmq_url="inproc://test-zmq-listener-prefetch",
+        mq_server_address="localhost",
+        mq_exchange_name="home",
+        mq_topic_filter="event.#",
+        mq_exchange_type="topic",
+        mq_prefetch_count=4,
+    )
+    listener.untrack()
+    listener._setup_channel()
+    channel = listener._mq_channel
+    channel.basic_qos.assert_called_once_with(prefetch_count=4)
+    assert channel.basic_consume.call_args.kwargs["auto_ack"] is False
+    listener.processor = MagicMock()
+    body = make_payload(data={"value": 1})
+    for tag in range(1, 4):
+        method = SimpleNamespace(routing_key="event.device.sensor", delivery_tag=tag)
+        listener.callback(channel, method, None, body)
+    assert listener.processor.send_pyobj.call_count == 3
+    # every second delivery is acknowledged, and the straggler on a timer
+    channel.basic_ack.assert_called_once_with(delivery_tag=2, multiple=True)
+    timer = blocking.return_value.call_later
+    assert timer.call_count == 2
+    timer.call_args.args[1]()
+    channel.basic_ack.assert_called_with(delivery_tag=3, multiple=True)
+    assert listener.acked == 3
+
+
+@pytest.mark.parametrize(
+    "pattern,routing_key,expected",
+    [
+        ("event.*.sensor", "event.device.sensor", True),
+        ("event.*.sensor", "event.device.other.sensor", False),
+        ("event.#", "event", True),
+        ("event.#", "event.device.sensor", True),
+        ("#.sensor", "sensor", True),
+        ("#.sensor", "event.device.sensor", True),
+        ("event.#.sensor", "event.sensor", True),
+        ("event.#.sensor", "event.a.b.sensor", True),
+        ("event.#.sensor", "events.a.sensor", False),
+        ("#", "anything.at.all", True),
+        ("event.heartbeat.*", "event.heartbeat", False),
+        ("#.#", "a", True),
+        ("#.#", "a.b", True),
+        ("a.#.#", "a", True),
+        ("a.#.#", "a.b.c", True),
+        ("a.#.#", "b.a", False),
+        ("#.a.#", "a", True),
+        ("#.a.#", "x.a.y", True),
+        ("#.a.#", "x.b.y", False),
+        ("#.*", "a", True),
+        ("#.*", "", False),
+    ],
+)
+def test_compile_topic_pattern(pattern, routing_key, expected):
+    from tailucas_pylib.rabbit import compile_topic_pattern
+
+    assert bool(compile_topic_pattern(pattern).fullmatch(routing_key)) is expected
+
+
+def test_zmq_listener_routes_topics(mocker):
+    """Test routed topics reach handlers and sinks, with unmatched topics going to the processor."""
+    import zmq
+
+    from tailucas_pylib.data import make_payload
+    from tailucas_pylib.rabbit import ZMQListener
+    from tailucas_pylib.zmq import try_close, zmq_socket
+
+    mocker.patch("pika.BlockingConnection", return_value=_mock_blocking_connection())
+    handled = []
+    listener = ZMQListener(
+        zmq_url="inproc://test-zmq-listener-routes",
+        mq_server_address="localhost",
+        mq_exchange_name="home",
+        mq_topic_filter="event.#",
+        mq_exchange_type="topic",
+        mq_routes={
+            "event.heartbeat.#": None,
+            "event.leader.*": lambda topic, event: handled.append((topic, event["value"])),
+            "event.*.camera": "inproc://test-zmq-listener-camera",
+        },
+    )
+    listener.untrack()
+    camera = zmq_socket(zmq.PULL)
+    camera.setsockopt(zmq.RCVTIMEO, 5000)
+    camera.bind("inproc://test-zmq-listener-camera")
+    listener.processor = MagicMock()
+    sink = zmq_socket(zmq.PUSH)
+    sink.connect("inproc://test-zmq-listener-camera")
+    listener._sinks["inproc://test-zmq-listener-camera"] = sink
+    body = make_payload(data={"value": 1})
+    try:
+        for topic in (
+            "event.heartbeat.app",
+            "event.leader.app",
+            "event.front.camera",
+            "event.front.sensor",
+            "event.front.sensor",
+        ):
+            listener._forward(topic=topic, body=body)
+        assert camera.recv_pyobj()["camera"]["value"] == 1
+    finally:
+        try_close(sink)
+        try_close(camera)
+    assert handled == [("event.leader.app", 1)]
+    assert listener.processor.send_pyobj.call_count == 2
+    assert listener._route("event.heartbeat.app")[2:] == ((), ())
+
+
+def test_zmq_listener_forwards_raw_frames(mocker):
+    """Test raw forwarding sends the topic and original body without decoding."""
+    import zmq
+
+    from tailucas_pylib.data import LazyPayload, make_payload
+    from tailucas_pylib.rabbit import ZMQListener
+    from tailucas_pylib.zmq import try_close, zmq_socket
+
+    mocker.patch("pika.BlockingConnection", return_value=_mock_blocking_connection())
+    handled = []
+    listener = ZMQListener(
+        zmq_url="inproc://test-zmq-listener-raw",
+        mq_server_address="localhost",
+        mq_exchange_name="home",
+        mq_topic_filter="event.#",
+        mq_exchange_type="topic",
+        mq_routes={"event.leader.*": lambda topic, payload: handled.append(payload)},
+        forward_raw=True,
+        check_header=True,
+    )
+    listener.untrack()
+    unpack = mocker.patch("tailucas_pylib.rabbit.unpack_payload")
+    sink = zmq_socket(zmq.PULL)
+    sink.setsockopt(zmq.RCVTIMEO, 5000)
+    sink.bind("inproc://test-zmq-listener-raw")
+    listener.processor = zmq_socket(zmq.PUSH)
+    listener.processor.connect("inproc://test-zmq-listener-raw")
+    body = make_payload(data={"value": 1})
+    try:
+        assert listener._forward(topic="event.front.sensor", body=body)
+        assert listener._forward(topic="event.leader.app", body=body)
+        # a malformed body is discarded before it reaches the consumer
+        assert listener._forward(topic="event.front.sensor", body=b"\x00")
+        assert sink.recv_multipart() == [b"event.front.sensor", body]
+        assert sink.poll(timeout=50) == 0
+    finally:
+        try_close(listener.processor)
+        try_close(sink)
+    unpack.assert_not_called()
+    (payload,) = handled
+    assert isinstance(payload, LazyPayload)
+    assert payload.body == body
+
+
+def test_rabbitmq_relay_spools_during_outage(mocker, tmp_path):
+    """Test messages are spooled while the broker is down and drained in order afterwards."""
+    import time
+
+    import zmq
+    from pika.exceptions import AMQPConnectionError
+
+    from tailucas_pylib.rabbit import RabbitMQRelay
+    from tailucas_pylib.zmq import try_close, zmq_socket
+
+    broker = _mock_blocking_connection()
+    blocking = mocker.patch("pika.BlockingConnection", side_effect=AMQPConnectionError("down"))
+    relay = RabbitMQRelay(
+        zmq_url="inproc://test-rabbit-relay-spool",
+        mq_server_address="localhost",
+        mq_exchange_name="home",
+        mq_topic_filter="event.#",
+        mq_exchange_type="topic",
+        spool_path=str(tmp_path / "relay.spool"),
+        spool_drain_rate=2,
+    )
+    relay.untrack()
+    source = zmq_socket(zmq.PULL)
+    source.bind("inproc://test-rabbit-relay-spool")
+    producer = zmq_socket(zmq.PUSH)
+    producer.connect("inproc://test-rabbit-relay-spool")
+    try:
+        for i in range(3):
+            producer.send_pyobj((f"event.{i}", {"value": i}))
+            relay.process_message(zmq_socket=source)
+        assert relay.spool_depth == 3
+        assert relay.spool_age > 0
+        # the broker comes back
+        blocking.side_effect = None
+        blocking.return_value = broker
+        relay._retry_at = 0.0
+        # live messages are not held behind the backlog
+        producer.send_pyobj(("event.live", {"value": 3}))
+        relay.process_message(zmq_socket=source)
+        assert relay.spool_depth == 3
+        relay._drain_checked = time.monotonic() - 1
+        assert relay.drain_spool() == 1
+        relay._drain_checked = time.monotonic() - 1
+        assert relay.drain_spool() == 0
+    finally:
+        try_close(producer)
+        try_close(source)
+        relay.close()
+    # two spooled messages go out as one flushed burst, then the last on its own
+    channel = relay._mq_channel
+    published = [call.kwargs["routing_key"] for call in channel.basic_publish.call_args_list]
+    assert published == ["event.live", "event.2"]
+    published = [call.kwargs["routing_key"] for call in channel._impl.basic_publish.call_args_list]
+    assert published == ["event.0", "event.1"]
+    assert relay.messages_published == 4
+
+
+def test_rabbitmq_relay_drain_failure_keeps_spool(mocker, tmp_path):
+    """Test a channel failure while draining leaves the messages spooled."""
+    from pika.exceptions import ChannelClosedByBroker
+
+    from tailucas_pylib.rabbit import RabbitMQRelay
+
+    broker = _mock_blocking_connection()
+    mocker.patch("pika.BlockingConnection", return_value=broker)
+    relay = RabbitMQRelay(
+        zmq_url="inproc://test-rabbit-relay-drain-failure",
+        mq_server_address="localhost",
+        mq_exchange_name="home",
+        mq_topic_filter="event.#",
+        mq_exchange_type="topic",
+        spool_path=str(tmp_path / "relay.spool"),
+    )
+    relay.untrack()
+    try:
+        relay._spool.append(routing_key="event.0", body=b"\x80")
+        relay._drain_allowance = 1.0
+        channel = relay._mq_channel
+        channel.basic_publish.side_effect = ChannelClosedByBroker(406, "PRECONDITION_FAILED")
+        assert relay.drain_spool() == 1
+        assert relay._mq_channel is None
+    finally:
+        relay.close()
+
+
+def test_coalescer_forwards_latest_value_per_interval(mocker):
+    """Test values within the interval are held, replaced and forwarded once it passes."""
+    from tailucas_pylib.rabbit import Coalescer
+
+    now = mocker.patch("time.monotonic", return_value=100.0)
+    forwarded = []
+    coalescer = Coalescer(interval_ms=1000, forward=lambda key, value: forwarded.append(value))
+    assert not coalescer.offer("a", 1)
+    assert coalescer.offer("a", 2)
+    assert coalescer.offer("a", 3)
+    assert not coalescer.offer("b", 1)
+    now.return_value = 100.5
+    assert coalescer.flush() == 0.5
+    now.return_value = 101.0
+    assert coalescer.flush() is None
+    assert forwarded == [1, 1, 3]
+    assert (coalescer.forwarded, coalescer.suppressed, len(coalescer)) == (3, 1, 0)
+
+
+def test_coalescer_suppresses_unchanged_values(mocker):
+    """Test values equal to the last one forwarded for their key are not forwarded again."""
+    from tailucas_pylib.rabbit import Coalescer
+
+    now = mocker.patch("time.monotonic", return_value=100.0)
+    forwarded = []
+    coalescer = Coalescer(interval_ms=1000, forward=lambda key, value: forwarded.append(value))
+    assert not coalescer.offer("a", 1)
+    assert coalescer.offer("a", 2)
+    # back to the forwarded value before the flush, so the held one is dropped
+    assert not coalescer.offer("a", 1)
+    now.return_value = 102.0
+    assert coalescer.flush() is None
+    assert not coalescer.offer("a", 1)
+    assert not coalescer.offer("a", 3)
+    assert forwarded == [1, 3]
+    assert (coalescer.forwarded, coalescer.suppressed, len(coalescer)) == (2, 3, 0)
+
+
+def test_zmq_listener_coalesces_heartbeats(mocker):
+    """Test heartbeats are coalesced per topic while device events pass straight through."""
+    from tailucas_pylib.data import make_payload
+    from tailucas_pylib.rabbit import ZMQListener
+
+    blocking = mocker.patch("pika.BlockingConnection", return_value=_mock_blocking_connection())
+    listener = ZMQListener(
+        zmq_url="inproc://test-zmq-listener-coalesce",
+        mq_server_address="localhost",
+        mq_exchange_name="home",
+        mq_topic_filter="event.#",
+        mq_exchange_type="topic",
+        coalesce_interval_ms=60000,
+    )
+    listener.untrack()
+    listener._setup_channel()
+    listener.processor = MagicMock()
+    for i in range(3):
+        listener._forward(topic="event.heartbeat.app", body=make_payload(data={"value": i}))
+        listener._forward(topic="event.front.sensor", body=make_payload(data={"value": i}))
+    sent = [call.args[0] for call in listener.processor.send_pyobj.call_args_list]
+    assert [list(message) for message in sent] == [["app"]] + [["sensor"]] * 3
+    assert (listener.coalescer.suppressed, len(listener.coalescer)) == (1, 1)
+    # one flush timer is armed for the held heartbeat
+    blocking.return_value.call_later.assert_called_once()
+    listener.coalescer._forwarded_at["event.heartbeat.app"] -= 60
+    blocking.return_value.call_later.call_args.args[1]()
+    assert listener.processor.send_pyobj.call_args.args[0]["app"]["value"] == 2
+
+
+def test_zmq_listener_decompresses_payloads(mocker):
+    """Test compressed payloads are decompressed before forwarding."""
+    from tailucas_pylib.data import make_payload
+    from tailucas_pylib.rabbit import ZMQListener
+
+    mocker.patch("pika.BlockingConnection", return_value=_mock_blocking_connection())
+    listener = ZMQListener(
+        zmq_url="inproc://test-zmq-listener-compressed",
+        mq_server_address="localhost",
+        mq_exchange_name="home",
+        mq_topic_filter="event.#",
+        mq_exchange_type="topic",
+    )
+    listener.untrack()
+    listener.processor = MagicMock()
+    image = b"\xff" * 4096
+    body = make_payload(data={"image": image}, compress_threshold=1024)
+    assert len(body) < len(image)
+    assert listener._forward(topic="event.front.camera", body=body)
+    assert listener._forward(topic="event.front.camera", body=b"\xc1\x01bad")
+    listener.processor.send_pyobj.assert_called_once()
+    assert listener.processor.send_pyobj.call_args.args[0]["camera"]["image"] == image
@@ -0,0 +1,59 @@
+def test_spool_append_peek_pop(tmp_path):
+    """Test records come back in order and consumed space is reused once empty."""
+    from tailucas_pylib.spool import Spool
+
+    spool = Spool(path=str(tmp_path / "relay.spool"), size=4096)
+    try:
+        assert spool.append("event.a", b"one", timestamp=1.0)
+        assert spool.append("event.b", b"two")
+        assert len(spool) == 2
+        assert spool.peek(count=5)[0] == ("event.a", b"one", 1.0)
+        assert spool.age > 0
+        spool.pop()
+        assert [record[:2] for record in spool.peek(count=5)] == [("event.b", b"two")]
+        spool.pop()
+        assert len(spool) == 0
+        assert spool.age == 0.0
+        assert spool._read == spool._write
+    finally:
+        spool.close()
+
+
+def test_spool_survives_reopen(tmp_path):
+    """Test unread records are still there when the spool file is opened again."""
+    from tailucas_pylib.spool import Spool
+
+    path = str(tmp_path / "relay.spool")
+    spool = Spool(path=path, size=4096)
+    for i in range(3):
+        spool.append(f"event.{i}", b"%d" % i)
+    spool.pop()
+    spool.close()
+    spool = Spool(path=path, size=4096)
+    try:
+        assert [record[:2] for record in spool.peek(count=5)] == [
+            ("event.1", b"1"),
+            ("event.2", b"2"),
+        ]
+    finally:
+        spool.close()
+
+
+def test_spool_compacts_then_drops_when_full(tmp_path):
+    """Test a full spool reclaims consumed space before dropping new records."""
+    from tailucas_pylib.spool import Spool
+
+    spool = Spool(path=str(tmp_path / "relay.spool"), size=256)
+    try:
+        body = b"x" * 40
+        appended = 0
+        while spool.append("event.x", body):
+            appended += 1
+        assert spool.dropped == 1
+        spool.pop(count=2)
+        # the two consumed records make room again
+        assert spool.append("event.y", body)
+        assert len(spool) == appended - 1
+        assert spool.peek(count=appended)[-1][0] == "event.y"
+    finally:
+        spool.close()
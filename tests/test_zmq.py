@@ -0,0 +1,232 @@
+import pytest
+
+pytest.importorskip("zmq", reason="requires the 'mq' extra")
+
+
+@pytest.fixture
+def provenance():
+    import tailucas_pylib.zmq as zmq_module
+
+    mode = zmq_module.socket_provenance
+    depth = zmq_module.socket_provenance_depth
+    yield zmq_module
+    zmq_module.set_socket_provenance(mode, depth=depth)
+
+
+def test_socket_provenance_shallow(provenance):
+    """Test shallow provenance stores frame tuples and formats them on demand."""
+    import zmq
+
+    provenance.set_socket_provenance(provenance.PROVENANCE_SHALLOW, depth=2)
+    socket = provenance.zmq_socket(zmq.PUSH)
+    try:
+        socket_info = provenance.zmq_sockets[socket]
+        assert len(socket_info.frames) == 2
+        assert socket_info.frames[0][0] == "test_socket_provenance_shallow"
+        assert "test_socket_provenance_shallow in" in socket_info.location
+    finally:
+        provenance.try_close(socket)
+
+
+def test_socket_provenance_full(provenance):
+    """Test full provenance stores the formatted stack eagerly."""
+    import zmq
+
+    provenance.set_socket_provenance(provenance.PROVENANCE_FULL)
+    socket = provenance.zmq_socket(zmq.PUSH)
+    try:
+        socket_info = provenance.zmq_sockets[socket]
+        assert socket_info.frames is None
+        assert socket_info.location.startswith("test_socket_provenance_full in")
+    finally:
+        provenance.try_close(socket)
+
+
+def test_socket_provenance_off(provenance):
+    """Test sockets stay registered without provenance when tracking is off."""
+    import zmq
+
+    provenance.set_socket_provenance(provenance.PROVENANCE_OFF)
+    socket = provenance.zmq_socket(zmq.PUSH)
+    try:
+        assert socket in provenance.zmq_sockets
+        assert provenance.zmq_sockets[socket].location is None
+    finally:
+        provenance.try_close(socket)
+    assert socket.closed
+
+
+def test_socket_provenance_invalid_mode(provenance):
+    """Test an unknown provenance mode is rejected."""
+    with pytest.raises(AssertionError):
+        provenance.set_socket_provenance("verbose")
+
+
+def test_socket_provenance_unknown_config(provenance, caplog):
+    """Test an unknown configured provenance mode warns and falls back to the default."""
+    import logging
+
+    with caplog.at_level(logging.WARNING):
+        assert provenance._configured_provenance("shalow") == provenance.PROVENANCE_SHALLOW
+    assert any(
+        getattr(record, "zmq_socket_provenance", None) == "shalow" for record in caplog.records
+    )
+    assert provenance._configured_provenance("full") == provenance.PROVENANCE_FULL
+
+
+def test_try_close_formats_provenance_lazily(provenance):
+    """Test closing a socket at INFO level leaves its creation stack unformatted."""
+    import logging
+
+    import zmq
+
+    from tailucas_pylib import log
+
+    provenance.set_socket_provenance(provenance.PROVENANCE_SHALLOW)
+    socket = provenance.zmq_socket(zmq.PUSH)
+    socket_info = provenance.zmq_sockets[socket]
+    old_level = log.level
+    log.setLevel(logging.INFO)
+    try:
+        provenance.try_close(socket)
+    finally:
+        log.setLevel(old_level)
+    assert socket.closed
+    assert socket_info.frames
+    assert socket_info._location is None
+
+
+def _pair(name, codec=None, peer_codec=None):
+    import zmq
+
+    from tailucas_pylib.zmq import zmq_socket
+
+    url = f"inproc://{name}"
+    server = zmq_socket(zmq.PAIR, codec=codec)
+    server.setsockopt(zmq.RCVTIMEO, 5000)
+    server.bind(url)
+    client = zmq_socket(zmq.PAIR, codec=peer_codec)
+    client.connect(url)
+    return server, client
+
+
+def test_send_recv_obj_with_codec():
+    """Test codec-aware sockets exchange a content-type frame and the encoded body."""
+    from tailucas_pylib.codec import CONTENT_TYPE_JSON
+    from tailucas_pylib.zmq import recv_obj, send_obj, try_close
+
+    server, client = _pair("test-codec-json", codec="json", peer_codec="json")
+    try:
+        send_obj(client, {"foo": "bar"})
+        assert recv_obj(server) == {"foo": "bar"}
+        send_obj(server, [1, 2])
+        assert client.recv_multipart() == [CONTENT_TYPE_JSON, b"[1,2]"]
+    finally:
+        try_close(server)
+        try_close(client)
+
+
+def test_send_recv_obj_default_pickle():
+    """Test sockets without a codec keep plain pickled frames."""
+    from tailucas_pylib.zmq import recv_obj, send_obj, try_close
+
+    server, client = _pair("test-codec-default")
+    try:
+        send_obj(client, ("topic", {"foo": "bar"}))
+        assert server.recv_pyobj() == ("topic", {"foo": "bar"})
+        client.send_pyobj({"x": 1})
+        assert recv_obj(server) == {"x": 1}
+    finally:
+        try_close(server)
+        try_close(client)
+
+
+def test_recv_obj_detects_codec_mismatch():
+    """Test a content-type mismatch between the two ends is detected."""
+    from tailucas_pylib.codec import ContentTypeMismatch
+    from tailucas_pylib.zmq import recv_obj, send_obj, try_close
+
+    server, client = _pair("test-codec-mismatch", codec="json", peer_codec="pickle")
+    try:
+        send_obj(client, {"foo": "bar"})
+        with pytest.raises(ContentTypeMismatch):
+            recv_obj(server)
+    finally:
+        try_close(server)
+        try_close(client)
+
+
+def test_socket_options_drop_newest():
+    """Test drop-newest discards messages that cannot be queued and counts them."""
+    import zmq
+
+    from tailucas_pylib.zmq import SocketOptions, socket_stats, try_close, zmq_socket
+
+    socket = zmq_socket(zmq.PUSH, options=SocketOptions(sndhwm=1, send_policy="drop-newest"))
+    try:
+        # no peer is connected, so nothing can be queued
+        for i in range(3):
+            assert socket.send_pyobj(i) is None
+        assert socket.getsockopt(zmq.SNDHWM) == 1
+        assert socket_stats(socket) == {"queued": 0, "sent": 0, "dropped": 3, "blocked_secs": 0.0}
+    finally:
+        try_close(socket)
+
+
+def test_socket_options_drop_oldest_backlog():
+    """Test drop-oldest holds the newest messages locally and flushes them in order."""
+    import zmq
+
+    from tailucas_pylib.zmq import SocketOptions, try_close, zmq_socket, zmq_sockets
+
+    socket = zmq_socket(zmq.PUSH, options=SocketOptions(send_policy="drop-oldest", backlog=2))
+    peer = zmq_socket(zmq.PULL)
+    peer.setsockopt(zmq.RCVTIMEO, 5000)
+    try:
+        socket.send(b"m1")
+        socket.send_multipart([b"m2", b"part"])
+        socket.send(b"m3")
+        stats = zmq_sockets[socket].stats
+        assert (stats.queued, stats.sent, stats.dropped) == (2, 0, 1)
+        peer.bind("inproc://test-drop-oldest")
+        socket.connect("inproc://test-drop-oldest")
+        assert socket.flush() == 0
+        assert peer.recv_multipart() == [b"m2", b"part"]
+        assert peer.recv_multipart() == [b"m3"]
+        assert (stats.queued, stats.sent, stats.dropped) == (0, 2, 1)
+    finally:
+        try_close(socket)
+        try_close(peer)
+
+
+def test_socket_options_block_with_send_timeout():
+    """Test the block policy gives up after the send timeout and accounts the wait."""
+    import zmq
+
+    from tailucas_pylib.zmq import SocketOptions, try_close, zmq_socket, zmq_sockets
+
+    socket = zmq_socket(zmq.PUSH, options=SocketOptions(send_timeout_ms=50))
+    try:
+        with pytest.raises(zmq.Again):
+            socket.send(b"m1")
+        stats = zmq_sockets[socket].stats
+        assert stats.dropped == 1
+        assert stats.blocked_secs >= 0.04
+    finally:
+        try_close(socket)
+
+
+def test_socket_options_invalid_policy():
+    from tailucas_pylib.zmq import SocketOptions
+
+    with pytest.raises(AssertionError):
+        SocketOptions(send_policy="drop-all")
+
+
+def test_socket_options_rejected_on_async_socket():
+    import zmq
+
+    from tailucas_pylib.zmq import SocketOptions, zmq_socket
+
+    with pytest.raises(AssertionError):
+        zmq_socket(zmq.PUSH, is_async=True, options=SocketOptions(sndhwm=1))